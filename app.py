@@ -1,27 +1,55 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from dotenv import load_dotenv
 import os
-import uuid
 from rembg import remove
-from PIL import Image
+from rembg.sessions import sessions_class
+import onnxruntime as ort
+import numpy as np
+import PIL
+from PIL import Image, ImageOps, features
 import io
-import traceback
+import tempfile
+import contextlib
+import hashlib
+import heapq
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import atexit
 import datetime
-import base64
+import pybase64
 from functools import wraps
 import threading
 import time
-from collections import deque
-import json
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple, Optional, Union
+import queue
+import orjson
+from flask.json.provider import JSONProvider
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 
 # Load environment variables from .env file
 load_dotenv()
 
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, used by jsonify() and request.get_json()"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Kirim bytes dari orjson langsung, tanpa decode/encode ulang
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # Configure CORS from environment variables
 cors_origins = os.getenv('CORS_ORIGINS', '*')
@@ -53,74 +81,95 @@ console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.INFO)
 console_handler.setFormatter(logging.Formatter(log_format, date_format))
 
+# Request thread hanya memasukkan record ke queue; tulis ke file/console di thread listener
+queue_handler = QueueHandler(queue.SimpleQueue())
+
+def _start_log_listener():
+    """Start the background thread that writes queued log records"""
+    global log_listener
+    # Queue baru per proses: setelah fork (gunicorn preload) thread listener parent tidak ikut
+    queue_handler.queue = queue.SimpleQueue()
+    log_listener = QueueListener(queue_handler.queue, file_handler, console_handler, respect_handler_level=True)
+    log_listener.start()
+
+_start_log_listener()
+os.register_at_fork(after_in_child=_start_log_listener)
+atexit.register(lambda: log_listener.stop())
+
 # Configure root logger
 logging.basicConfig(
     level=getattr(logging, LOG_LEVEL.upper()),
-    handlers=[file_handler, console_handler]
+    handlers=[queue_handler]
 )
 
 logger = logging.getLogger(__name__)
 
+def get_client_ip():
+    """Client IP for logging, looked up once per request and reused by log_request and the endpoints"""
+    environ = request.environ
+    client_ip = environ.get('bg_remover.client_ip')
+    if client_ip is None:
+        client_ip = environ['bg_remover.client_ip'] = environ.get('HTTP_X_FORWARDED_FOR', environ.get('REMOTE_ADDR', 'unknown'))
+    return client_ip
+
 # Logging decorator for API endpoints
+# Field request dikumpulkan di g.access_log (juga oleh log_file_upload) lalu ditulis sebagai satu baris JSON;
+# timestamp dari %(asctime)s formatter
 def log_api_access(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        # Get client information
-        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
-        user_agent = request.headers.get('User-Agent', 'unknown')
-        endpoint = request.endpoint
-        method = request.method
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-        # Log the access
-        logger.info(f"API_ACCESS | {timestamp} | {method} {endpoint} | IP: {client_ip} | UA: {user_agent[:100]}...")
+        g.access_log = access_log = {
+            'method': request.method,
+            'endpoint': request.endpoint,
+            'ip': get_client_ip()
+        }
 
         # Execute the function
         try:
             result = func(*args, **kwargs)
-
-            # Log successful completion
-            if hasattr(result, 'status_code'):
-                status_code = result.status_code
+            if isinstance(result, tuple):
+                access_log['status'] = result[1]
             else:
-                status_code = 200
-
-            logger.info(f"API_SUCCESS | {timestamp} | {method} {endpoint} | IP: {client_ip} | Status: {status_code}")
-
+                access_log['status'] = getattr(result, 'status_code', 200)
             return result
 
         except Exception as e:
-            # Log error
-            logger.error(f"API_ERROR | {timestamp} | {method} {endpoint} | IP: {client_ip} | Error: {str(e)}")
+            access_log['status'] = 400 if isinstance(e, BadImage) else getattr(e, 'code', 500)
+            access_log['error'] = str(e)
             raise
 
+        finally:
+            level = logging.ERROR if access_log['status'] >= 500 else logging.INFO
+            if logger.isEnabledFor(level):
+                access_log['ua'] = request.headers.get('User-Agent', 'unknown')[:100]
+                logger.log(level, "API_REQUEST | %s", orjson.dumps(access_log).decode())
+
     return wrapper
 
 def log_file_upload(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-        # Check if file was uploaded
-        if 'file' in request.files:
-            file = request.files['file']
-            if file and file.filename:
-                file_size = len(file.read())
-                file.seek(0)  # Reset file pointer
-                file_ext = file.filename.split('.')[-1].lower() if '.' in file.filename else 'unknown'
-
-                logger.info(f"FILE_UPLOAD | {timestamp} | IP: {client_ip} | File: {file.filename} | Size: {file_size} bytes | Type: {file_ext}")
+        access_log = g.get('access_log')
+        if access_log is not None and logger.isEnabledFor(logging.INFO):
+            # Check if file was uploaded
+            if 'file' in request.files:
+                file = request.files['file']
+                if file and file.filename:
+                    # Ukuran dari header part, atau seek/tell pada stream (tanpa menyalin bytes)
+                    _, dot, file_ext = file.filename.rpartition('.')
+                    access_log['file'] = {
+                        'name': file.filename,
+                        'size': file.content_length or stream_size(file.stream),
+                        'type': file_ext.lower() if dot else 'unknown'
+                    }
 
-        # Check if base64 data was provided
-        if request.is_json:
-            try:
-                data = request.get_json()
-                if data and 'image' in data:
-                    base64_length = len(data['image'])
-                    logger.info(f"BASE64_INPUT | {timestamp} | IP: {client_ip} | Base64 Length: {base64_length} characters")
-            except:
-                pass
+            # Body JSON diparse sekali di endpoint; di sini cukup panjang dari header.
+            # Body octet-stream berisi byte gambar mentah, jadi dicatat terpisah dari panjang base64
+            if request.content_length:
+                if request.is_json:
+                    access_log['base64_length'] = request.content_length
+                elif request.mimetype == 'application/octet-stream':
+                    access_log['body_length'] = request.content_length
 
         return func(*args, **kwargs)
     return wrapper
@@ -134,41 +183,287 @@ RATE_LIMIT_DEFAULT_PER_MINUTE = os.getenv('RATE_LIMIT_DEFAULT_PER_MINUTE', '100'
 RATE_LIMIT_REMOVE_BG_PER_MINUTE = os.getenv('RATE_LIMIT_REMOVE_BG_PER_MINUTE', '10')
 RATE_LIMIT_PREVIEW_PER_MINUTE = os.getenv('RATE_LIMIT_PREVIEW_PER_MINUTE', '15')
 RATE_LIMIT_BASE64_PER_MINUTE = os.getenv('RATE_LIMIT_BASE64_PER_MINUTE', '12')
-RATE_LIMIT_HEALTH_PER_MINUTE = os.getenv('RATE_LIMIT_HEALTH_PER_MINUTE', '200')
 RATE_LIMIT_INFO_PER_MINUTE = os.getenv('RATE_LIMIT_INFO_PER_MINUTE', '60')
 
+# Storage rate limiting: memory (development) atau redis (production, dibagi antar worker)
+RATE_LIMIT_STORAGE = os.getenv('RATE_LIMIT_STORAGE', 'memory')
+RATE_LIMIT_STRATEGY = os.getenv('RATE_LIMIT_STRATEGY', 'moving-window')
+RATE_LIMIT_STORAGE_OPTIONS = {}
+if RATE_LIMIT_STORAGE == 'redis':
+    import redis
+
+    RATE_LIMIT_STORAGE_URI = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    # Satu connection pool dipakai ulang oleh semua thread di worker ini
+    RATE_LIMIT_STORAGE_OPTIONS['connection_pool'] = redis.ConnectionPool.from_url(
+        RATE_LIMIT_STORAGE_URI,
+        max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 32))
+    )
+else:
+    RATE_LIMIT_STORAGE_URI = 'memory://'
+
 # Initialize Limiter dengan konfigurasi dari environment
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    storage_options=RATE_LIMIT_STORAGE_OPTIONS,
+    strategy=RATE_LIMIT_STRATEGY,
     default_limits=[f"{RATE_LIMIT_DEFAULT_PER_HOUR} per hour", f"{RATE_LIMIT_DEFAULT_PER_MINUTE} per minute"]
 )
 
 # Konfigurasi folder dari environment variables
 UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
 OUTPUT_FOLDER = os.getenv('OUTPUT_FOLDER', 'outputs')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp'}
+# Umur maksimum file di UPLOAD_FOLDER/OUTPUT_FOLDER dan interval pembersihan (detik)
+FILE_TTL_SECONDS = int(os.getenv('FILE_TTL_SECONDS', 3600))
+CLEANUP_INTERVAL_SECONDS = int(os.getenv('CLEANUP_INTERVAL_SECONDS', 60))
+ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp'})
+PNG_COMPRESS_LEVEL = int(os.getenv('PNG_COMPRESS_LEVEL', 1))  # zlib level untuk encode PNG hasil (0-9)
+MAX_INPUT_EDGE = int(os.getenv('MAX_INPUT_EDGE', 1536))  # Sisi terpanjang input yang dikirim ke model
+MAX_OUTPUT_EDGE = int(os.getenv('MAX_OUTPUT_EDGE', 8192))  # Batas atas max_width/max_height dari client
+
+# Cache hasil per isi gambar + parameter output; 0 = nonaktif (memory ~ jumlah entry x ukuran output)
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 64))
+RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', 3600))  # Detik
+# Batas memory cache per worker: total byte output yang disimpan, dan output terbesar yang boleh masuk cache
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv('RESULT_CACHE_MAX_ENTRY_BYTES', 8 * 1024 * 1024))
 
 # Buat folder jika tidak ada
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
+# Konfigurasi model rembg dari environment variables
+REMBG_MODEL = os.getenv('REMBG_MODEL', 'u2net')
+# Path ke model ONNX custom (mis. hasil quantize_model.py), kosong = model bawaan rembg
+REMBG_MODEL_PATH = os.getenv('REMBG_MODEL_PATH', '')
+# Comma-separated ONNX Runtime providers, kosong = auto-detect (CUDA jika tersedia)
+REMBG_PROVIDERS = [p.strip() for p in os.getenv('REMBG_PROVIDERS', '').split(',') if p.strip()]
+
+# Thread ONNX Runtime per worker; idealnya jumlah core / jumlah gunicorn worker
+ORT_INTRA_OP_THREADS = int(os.getenv('ORT_INTRA_OP_THREADS', '4'))
+
+def _new_session(model_name, providers, **kwargs):
+    """Create a rembg session like rembg.new_session, but with our ORT thread settings"""
+    session_class = next((sc for sc in sessions_class if sc.name() == model_name), None)
+    if session_class is None:
+        raise ValueError(f"Unknown rembg model: {model_name}")
+
+    sess_opts = ort.SessionOptions()
+    sess_opts.intra_op_num_threads = ORT_INTRA_OP_THREADS
+    sess_opts.inter_op_num_threads = 1
+    sess_opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    return session_class(model_name, sess_opts, providers, **kwargs)
+
+def _check_cuda_library_path():
+    """Warn when pip-installed CUDA libraries are missing from LD_LIBRARY_PATH"""
+    ld_library_path = os.getenv('LD_LIBRARY_PATH', '')
+    for lib_dir in ('nvidia/cudnn/lib', 'nvidia/cublas/lib'):
+        if lib_dir not in ld_library_path:
+            logger.warning(f"CUDA_LIBS | {lib_dir} not in LD_LIBRARY_PATH, CUDAExecutionProvider may fall back to CPU")
+
+# Urutan preferensi execution provider saat auto-detect
+ACCELERATED_PROVIDERS = ('CUDAExecutionProvider', 'OpenVINOExecutionProvider', 'DmlExecutionProvider')
+
+def _pick_providers():
+    """Pick ONNX Runtime execution providers, preferring an accelerator when available"""
+    available = ort.get_available_providers()
+    logger.info(f"ORT_PROVIDERS | Available: {available} | CUDA_VISIBLE_DEVICES: {os.getenv('CUDA_VISIBLE_DEVICES', 'all')}")
+
+    if REMBG_PROVIDERS:
+        providers = REMBG_PROVIDERS
+    else:
+        # Akselerator pertama yang tersedia (onnxruntime-gpu / -openvino / -directml), lalu CPU
+        accelerator = next((p for p in ACCELERATED_PROVIDERS if p in available), None)
+        providers = [accelerator, 'CPUExecutionProvider'] if accelerator else ['CPUExecutionProvider']
+
+    if 'CUDAExecutionProvider' in providers:
+        _check_cuda_library_path()
+
+    return providers
+
+# Satu session rembg per proses (per gunicorn worker), dibuat sekali saat import.
+# InferenceSession.run() aman dipanggil dari banyak thread sekaligus, jadi session
+# ini dipakai bersama oleh semua request dan worker thread queue.
+SESSION_PROVIDERS = _pick_providers()
+if REMBG_MODEL_PATH:
+    # Model custom dengan arsitektur U2-Net (mis. versi INT8 hasil quantization)
+    REMBG_MODEL = 'u2net_custom'
+    SESSION = _new_session(REMBG_MODEL, SESSION_PROVIDERS, model_path=os.path.expanduser(REMBG_MODEL_PATH))
+else:
+    SESSION = _new_session(REMBG_MODEL, SESSION_PROVIDERS)
+active_providers = SESSION.inner_session.get_providers()
+logger.info(f"REMBG_SESSION | Model: {REMBG_MODEL} | Providers: {active_providers} | Intra-op threads: {ORT_INTRA_OP_THREADS}")
+# Pillow-SIMD memakai suffix .postN pada versinya
+logger.info(f"PIL_VERSION | {PIL.__version__} | SIMD build: {'.post' in PIL.__version__} | libjpeg-turbo: {features.check_feature('libjpeg_turbo')}")
+
+# Jika GPU diminta secara eksplisit, jangan diam-diam jalan di CPU
+if 'CUDAExecutionProvider' in REMBG_PROVIDERS and active_providers[0] != 'CUDAExecutionProvider':
+    raise RuntimeError(f"CUDAExecutionProvider requested via REMBG_PROVIDERS but session is using {active_providers}")
+
+# Warm-up: satu inference dummy saat startup agar arena/kernel ORT sudah siap sebelum request pertama
+REMBG_WARMUP = os.getenv('REMBG_WARMUP', 'True').lower() == 'true'
+if REMBG_WARMUP:
+    warmup_start = time.perf_counter()
+    remove(Image.new('RGB', (320, 320), (127, 127, 127)), session=SESSION)
+    logger.info(f"REMBG_WARMUP | {(time.perf_counter() - warmup_start) * 1000:.0f} ms")
+
+# Micro-batching inference: gabungkan beberapa request bersamaan ke satu ONNX run
+REMBG_BATCH_SIZE = int(os.getenv('REMBG_BATCH_SIZE', '1'))  # 1 = nonaktif
+REMBG_BATCH_WAIT_MS = int(os.getenv('REMBG_BATCH_WAIT_MS', '10'))  # Maksimal tunggu batch terisi
+# Model dengan preprocessing U2-Net standar (320x320, ImageNet mean/std)
+U2NET_BATCH_MODELS = frozenset({'u2net', 'u2netp', 'u2net_human_seg', 'u2net_custom'})
+
+class BatchingInferencer:
+    """
+    Batch concurrent U2-Net predictions into a single ONNX Runtime call
+
+    Exposes the same predict() as a rembg session so it can be passed to
+    remove(img, session=...); cutout and post-processing stay in rembg.
+    """
+
+    def __init__(self, session, max_batch_size, max_wait_ms):
+        self.session = session
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.input_name = session.inner_session.get_inputs()[0].name
+        self.batching_supported = True
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def predict(self, img, *args, **kwargs):
+        """Queue an image for the next batch and wait for its mask"""
+        future = Future()
+        self.requests.put((img, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._predict_batch(batch)
+
+    def _predict_batch(self, batch):
+        if len(batch) > 1 and not self.batching_supported:
+            self._predict_each(batch)
+            return
+
+        try:
+            inputs = np.concatenate([
+                self.session.normalize(img, (0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320))[self.input_name]
+                for img, _ in batch
+            ])
+            preds = self.session.inner_session.run(None, {self.input_name: inputs})[0][:, 0, :, :]
+        except Exception as e:
+            if len(batch) > 1:
+                # Model dengan batch dimension tetap: jatuh ke prediksi per gambar
+                logger.warning(f"REMBG_BATCH | Batched inference failed, disabling batching: {str(e)}")
+                self.batching_supported = False
+                self._predict_each(batch)
+            else:
+                batch[0][1].set_exception(e)
+            return
+
+        for (img, future), pred in zip(batch, preds):
+            ma = np.max(pred)
+            mi = np.min(pred)
+            pred = (pred - mi) / (ma - mi)
+            mask = Image.fromarray((pred * 255).astype('uint8'), mode='L')
+            future.set_result([mask.resize(img.size, Image.Resampling.LANCZOS)])
+
+    def _predict_each(self, batch):
+        for img, future in batch:
+            try:
+                future.set_result(self.session.predict(img))
+            except Exception as e:
+                future.set_exception(e)
+
+if REMBG_BATCH_SIZE > 1 and REMBG_MODEL in U2NET_BATCH_MODELS:
+    INFERENCE_SESSION = BatchingInferencer(SESSION, REMBG_BATCH_SIZE, REMBG_BATCH_WAIT_MS)
+    logger.info(f"REMBG_BATCH | Batch size: {REMBG_BATCH_SIZE} | Max wait: {REMBG_BATCH_WAIT_MS}ms")
+else:
+    if REMBG_BATCH_SIZE > 1:
+        logger.warning(f"REMBG_BATCH | Batching not supported for model {REMBG_MODEL}, using direct session")
+    INFERENCE_SESSION = SESSION
+
 # Queue System Configuration
 MAX_CONCURRENT_JOBS = int(os.getenv('MAX_CONCURRENT_JOBS', '3'))  # Maksimal proses bersamaan
 MAX_QUEUE_SIZE = int(os.getenv('MAX_QUEUE_SIZE', '20'))  # Maksimal antrian
 QUEUE_TIMEOUT = int(os.getenv('QUEUE_TIMEOUT', '300'))  # Timeout dalam detik
+# Long-poll menahan satu thread gthread selama menunggu: batasi lamanya (jauh di bawah timeout
+# HEALTHCHECK 10 detik) dan jumlah penunggu sekaligus, agar /health tetap dapat thread
+LONG_POLL_MAX_SECONDS = int(os.getenv('LONG_POLL_MAX_SECONDS', '5'))  # Batas ?wait= pada status job
+LONG_POLL_MAX_WAITERS = int(os.getenv('LONG_POLL_MAX_WAITERS', max(1, int(os.getenv('GUNICORN_THREADS', '4')) // 2)))
+MAX_STATUS_BATCH = 100  # Maksimal job id per request /queue/jobs/status
 
 # Queue System Implementation
+# Format output -> (ekstensi file download, MIME type)
+_FORMAT_META = {
+    'PNG': ('png', 'image/png'),
+    'JPEG': ('jpg', 'image/jpeg'),
+    'JPG': ('jpg', 'image/jpeg'),
+    'WEBP': ('webp', 'image/webp'),
+}
+
+class OptimizationParams(NamedTuple):
+    """Output options parsed once from the request form or JSON body"""
+    format: str = 'PNG'
+    quality: int = 85
+    max_width: Optional[int] = None
+    max_height: Optional[int] = None
+    is_preview: bool = False
+
+def parse_optimization_params(source, is_preview=False):
+    """Read format/quality/max_width/max_height from a form, JSON dict or query args"""
+    output_format = str(source.get('format') or 'PNG').upper()
+    max_width = _opt_int(source.get('max_width'), hi=MAX_OUTPUT_EDGE)
+    max_height = _opt_int(source.get('max_height'), hi=MAX_OUTPUT_EDGE)
+    return OptimizationParams(
+        format=output_format if output_format in _FORMAT_META else 'PNG',
+        quality=_opt_int(source.get('quality'), 85, lo=1, hi=100),
+        # 0 atau negatif berarti tanpa batas
+        max_width=max_width if max_width and max_width > 0 else None,
+        max_height=max_height if max_height and max_height > 0 else None,
+        is_preview=is_preview
+    )
+
+class JobRecord(NamedTuple):
+    """Immutable payload of a queued job, built by the endpoint and read only by the worker"""
+    image_source: Union[str, bytes]  # Path file spool upload, atau bytes hasil decode base64
+    filename: str
+    optimization_params: OptimizationParams
+    is_base64: bool = False
+
 class JobQueue:
     def __init__(self):
         self.queue = deque()
         self.active_jobs = {}  # job_id -> job_info
-        self.completed_jobs = {}  # job_id -> job_info (completed/failed)
+        self.completed_jobs = OrderedDict()  # job_id -> job_info (completed/failed), urut waktu selesai
         self.lock = threading.Lock()
+        # Worker menunggu di sini; di-notify saat job masuk antrian atau slot proses kosong
+        self.job_available = threading.Condition(self.lock)
+        # Long-poll status job menunggu di sini; di-notify_all saat ada job yang selesai/gagal
+        self.job_finished = threading.Condition(self.lock)
+        self.long_poll_slots = threading.BoundedSemaphore(LONG_POLL_MAX_WAITERS)
+        self.processing_count = 0
         self.job_counter = 0
+        # Posisi antrian = enqueue_seq job - head_seq (antrian FIFO, tanpa queue.index)
+        self.enqueue_seq = 0
+        self.head_seq = 0
 
-    def add_job(self, job_type, client_ip, file_info=None):
-        """Add job to queue"""
+    def add_job(self, job_type, client_ip, file_info=None, record=None):
+        """Add job to queue (record is stored before the worker can pick the job up)"""
         with self.lock:
             # Check if queue is full
             if len(self.queue) >= MAX_QUEUE_SIZE:
@@ -192,51 +487,67 @@ class JobQueue:
                 'started_at': None,
                 'completed_at': None,
                 'progress': 0,
-                'message': 'Job queued...'
+                'message': 'Job queued...',
+                'record': record
             }
+            job_info['enqueue_seq'] = self.enqueue_seq
+            self.enqueue_seq += 1
 
             self.queue.append(job_id)
             self.active_jobs[job_id] = job_info
+            self.job_available.notify()
 
-            logger.info(f"QUEUE_JOB_ADDED | {job_id} | {job_type} | IP: {client_ip} | Queue position: {len(self.queue)}")
+            logger.info("QUEUE_JOB_ADDED | %s | %s | IP: %s | Queue position: %s", job_id, job_type, client_ip, len(self.queue))
 
             return job_id, None
 
     def get_next_job(self):
-        """Get next job from queue"""
-        with self.lock:
-            if not self.queue:
-                return None
-
-            # Check if we can start a new job
-            if len([j for j in self.active_jobs.values() if j['status'] == 'processing']) >= MAX_CONCURRENT_JOBS:
-                return None
+        """Block until a job is queued and a processing slot is free, then start it"""
+        with self.job_available:
+            while not self.queue or self.processing_count >= MAX_CONCURRENT_JOBS:
+                self.job_available.wait()
 
             job_id = self.queue.popleft()
+            self.head_seq += 1
             job_info = self.active_jobs.get(job_id)
 
             if job_info:
                 job_info['status'] = 'processing'
                 job_info['started_at'] = datetime.datetime.now()
                 job_info['message'] = 'Processing...'
-                logger.info(f"QUEUE_JOB_STARTED | {job_id} | Active jobs: {len([j for j in self.active_jobs.values() if j['status'] == 'processing'])}")
+                self.processing_count += 1
+                logger.info("QUEUE_JOB_STARTED | %s | Active jobs: %s", job_id, self.processing_count)
 
             return job_id
 
     def update_job_progress(self, job_id, progress, message=None):
         """Update job progress"""
+        # Tanpa lock: hanya thread job yang menulis progress, dan assignment item dict atomic di CPython
+        job_info = self.active_jobs.get(job_id)
+        if job_info:
+            job_info['progress'] = progress
+            if message:
+                job_info['message'] = message
+
+    def release_slot(self, job_id):
+        """Free a job's processing slot while its result is still being saved"""
         with self.lock:
             job_info = self.active_jobs.get(job_id)
-            if job_info:
-                job_info['progress'] = progress
-                if message:
-                    job_info['message'] = message
+            if job_info and job_info['status'] == 'processing':
+                job_info['status'] = 'saving'
+                self.processing_count -= 1
+                self.job_available.notify()
 
     def complete_job(self, job_id, success=True, error_message=None):
         """Mark job as completed"""
         with self.lock:
             job_info = self.active_jobs.get(job_id)
             if job_info:
+                if job_info['status'] == 'processing':
+                    # Slot proses kosong, bangunkan worker untuk job berikutnya
+                    self.processing_count -= 1
+                    self.job_available.notify()
+
                 job_info['status'] = 'completed' if success else 'failed'
                 job_info['completed_at'] = datetime.datetime.now()
                 job_info['progress'] = 100
@@ -246,39 +557,71 @@ class JobQueue:
                 else:
                     job_info['message'] = error_message or 'Job failed'
 
+                # Input tidak dibutuhkan lagi: lepas payload dan hapus file spool
+                record = job_info.pop('record', None)
+                if record and isinstance(record.image_source, str):
+                    discard_spool(record.image_source)
+
                 # Move to completed jobs
                 self.completed_jobs[job_id] = job_info
                 del self.active_jobs[job_id]
 
-                # Keep only last 100 completed jobs
-                if len(self.completed_jobs) > 100:
-                    oldest_job = min(self.completed_jobs.keys(),
-                                   key=lambda k: self.completed_jobs[k]['completed_at'])
-                    del self.completed_jobs[oldest_job]
+                # Keep only last 100 completed jobs (yang paling lama selesai ada di depan)
+                while len(self.completed_jobs) > 100:
+                    self.completed_jobs.popitem(last=False)
+
+                self.job_finished.notify_all()
 
-                logger.info(f"QUEUE_JOB_COMPLETED | {job_id} | Success: {success}")
+                logger.info("QUEUE_JOB_COMPLETED | %s | Success: %s", job_id, success)
 
     def get_job_status(self, job_id):
         """Get job status"""
-        with self.lock:
-            job_info = self.active_jobs.get(job_id) or self.completed_jobs.get(job_id)
-            if job_info:
-                return {
-                    'id': job_info['id'],
-                    'status': job_info['status'],
-                    'progress': job_info['progress'],
-                    'message': job_info['message'],
-                    'created_at': job_info['created_at'].isoformat(),
-                    'started_at': job_info['started_at'].isoformat() if job_info['started_at'] else None,
-                    'completed_at': job_info['completed_at'].isoformat() if job_info['completed_at'] else None,
-                    'queue_position': self.queue.index(job_id) + 1 if job_id in self.queue else 0
-                }
-            return None
+        # Tanpa lock: dict.get atomic di CPython, dan complete_job mengisi completed_jobs
+        # sebelum menghapus dari active_jobs sehingga job selalu ditemukan di salah satunya
+        job_info = self.active_jobs.get(job_id) or self.completed_jobs.get(job_id)
+        if job_info:
+            status = job_info['status']
+            return {
+                'id': job_info['id'],
+                'status': status,
+                'progress': job_info['progress'],
+                'message': job_info['message'],
+                'created_at': job_info['created_at'].isoformat(),
+                'started_at': job_info['started_at'].isoformat() if job_info['started_at'] else None,
+                'completed_at': job_info['completed_at'].isoformat() if job_info['completed_at'] else None,
+                'queue_position': job_info['enqueue_seq'] - self.head_seq + 1 if status == 'queued' else 0
+            }
+        return None
+
+    def wait_for_jobs(self, job_ids, timeout):
+        """
+        Block until one of the jobs is completed/failed (or unknown) or timeout seconds pass
+
+        Returns immediately when LONG_POLL_MAX_WAITERS requests are already waiting,
+        so long-polls can never take every request thread of the worker.
+        """
+        if not self.long_poll_slots.acquire(blocking=False):
+            return
+        try:
+            with self.job_finished:
+                self.job_finished.wait_for(lambda: any(job_id not in self.active_jobs for job_id in job_ids), timeout)
+        finally:
+            self.long_poll_slots.release()
+
+    def load(self):
+        """
+        (jobs processing, jobs waiting) for the direct-vs-queue decision
+
+        Reads two counters without the lock or scanning active_jobs; a slightly
+        stale value only means one request takes the other path.
+        """
+        return self.processing_count, len(self.queue)
 
     def get_queue_status(self):
         """Get overall queue status"""
         with self.lock:
-            processing_jobs = [j for j in self.active_jobs.values() if j['status'] == 'processing']
+            # 'saving' = inferensi selesai, file hasil masih ditulis; tetap dihitung aktif
+            processing_jobs = [j for j in self.active_jobs.values() if j['status'] in ('processing', 'saving')]
             queued_jobs = [j for j in self.active_jobs.values() if j['status'] == 'queued']
 
             return {
@@ -305,73 +648,56 @@ class JobQueue:
 job_queue = JobQueue()
 
 # Background job processor function
-def process_background_removal_job(job_id, image_data, filename, optimization_params, output_format):
-    """Process background removal job"""
+def process_background_removal_job(job_id, record):
+    """Process background removal job described by a JobRecord"""
+    image_source = record.image_source
+    filename = record.filename
+    params = record.optimization_params
+    output_format = params.format
     try:
         # Update progress
         job_queue.update_job_progress(job_id, 10, "Validating image...")
 
-        # Validasi image dengan PIL
-        try:
-            from PIL import Image
-            img = Image.open(io.BytesIO(image_data))
-            img.verify()
-        except Exception as img_e:
-            job_queue.complete_job(job_id, False, f'Invalid image file: {str(img_e)}')
-            return
-
-        # Reset BytesIO untuk rembg
-        img_data_for_rembg = io.BytesIO(image_data)
-
-        # Update progress
-        job_queue.update_job_progress(job_id, 30, "Removing background...")
-
-        # Proses background removal
-        logger.info(f"Processing image job {job_id}: {filename}")
-        raw_output_data = remove(img_data_for_rembg.read())
-
-        # Update progress
-        job_queue.update_job_progress(job_id, 60, "Optimizing output...")
-
-        # Get original image info
-        original_info = get_image_info(image_data)
-
         # Check if this is a preview job
-        is_preview = optimization_params.get('is_preview', False)
-        is_base64 = job_queue.active_jobs.get(job_id, {}).get('is_base64', False)
+        is_preview = params.is_preview
+        is_base64 = record.is_base64
 
         # Set appropriate dimensions for preview jobs
-        max_width = optimization_params.get('max_width')
-        max_height = optimization_params.get('max_height')
+        max_width = params.max_width
+        max_height = params.max_height
 
         if is_preview:
             # For preview jobs, cap at smaller sizes
             max_width = min(max_width or 800, 800)
             max_height = min(max_height or 600, 600)
 
-        # Optimize the output
-        optimized_output_data = optimize_image(
-            raw_output_data,
-            output_format=output_format,
-            quality=optimization_params.get('quality', 85),
-            max_width=max_width,
-            max_height=max_height
-        )
+        # Update progress
+        job_queue.update_job_progress(job_id, 30, "Removing background...")
 
-        # Get optimized image info
-        optimized_info = get_image_info(optimized_output_data)
+        # Decode, proses background removal dan optimize output (atau ambil dari cache)
+        logger.info("Processing image job %s: %s", job_id, filename)
+        image_size = os.path.getsize(image_source) if isinstance(image_source, str) else len(image_source)
+        try:
+            optimized_output_data, original_info, optimized_info = render_output(
+                image_source, image_size, output_format,
+                params.quality, max_width, max_height, fast=is_preview
+            )
+        except BadImage as e:
+            job_queue.complete_job(job_id, False, str(e))
+            return
 
         # Update progress
         job_queue.update_job_progress(job_id, 80, "Saving result...")
 
-        # Generate unique filename
-        file_id = job_id.replace('job_', '')  # Use job_id as identifier
-        output_filename = f"{file_id}_output.{output_format.lower() if output_format != 'JPG' else 'jpg'}"
-        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-
-        # Simpan hasil
-        with open(output_path, 'wb') as f:
-            f.write(optimized_output_data)
+        # Job base64 dikembalikan dari memory; hanya job file yang disimpan ke disk untuk diunduh
+        output_path = None
+        if is_base64:
+            job_queue.active_jobs[job_id]['result_base64'] = pybase64.b64encode(optimized_output_data).decode('ascii')
+        else:
+            # Generate unique filename
+            file_id = job_id.replace('job_', '')  # Use job_id as identifier
+            output_filename = f"{file_id}_output.{_FORMAT_META[output_format][0]}"
+            output_path = os.path.join(OUTPUT_FOLDER, output_filename)
 
         # Store job result info for retrieval
         job_queue.active_jobs[job_id]['result_info'] = {
@@ -380,15 +706,16 @@ def process_background_removal_job(job_id, image_data, filename, optimization_pa
             'optimized_info': optimized_info,
             'filename': filename,
             'output_format': output_format,
+            'quality': params.quality,
             'is_preview': is_preview,
             'is_base64': is_base64
         }
 
-        # For base64 jobs, store the result in memory as well
-        if is_base64:
-            with open(output_path, 'rb') as f:
-                result_base64 = base64.b64encode(f.read()).decode('utf-8')
-            job_queue.active_jobs[job_id]['result_base64'] = result_base64
+        if output_path:
+            # Simpan hasil di thread I/O; slot proses dilepas agar job berikutnya bisa langsung mulai
+            job_queue.release_slot(job_id)
+            io_executor.submit(write_job_result, job_id, output_path, optimized_output_data)
+            return
 
         # Update progress
         job_queue.update_job_progress(job_id, 100, "Job completed successfully!")
@@ -397,9 +724,30 @@ def process_background_removal_job(job_id, image_data, filename, optimization_pa
         job_queue.complete_job(job_id, True)
 
     except Exception as e:
-        logger.error(f"Error processing job {job_id}: {str(e)}")
+        logger.error("Error processing job %s: %s", job_id, e)
         job_queue.complete_job(job_id, False, f'Processing failed: {str(e)}')
 
+def write_job_result(job_id, output_path, data):
+    """Write a finished job's output file on the I/O pool, then complete the job"""
+    try:
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        schedule_expiry(output_path)
+    except Exception as e:
+        logger.error("Error saving result for job %s: %s", job_id, e)
+        job_queue.complete_job(job_id, False, f'Failed to save result: {str(e)}')
+        return
+
+    job_queue.update_job_progress(job_id, 100, "Job completed successfully!")
+    job_queue.complete_job(job_id, True)
+
+# Thread pool untuk memproses job; jumlah thread = slot proses di JobQueue
+job_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_JOBS, thread_name_prefix='bgrm')
+atexit.register(job_executor.shutdown, wait=False)
+# Thread terpisah untuk menulis file hasil, agar thread job tidak menunggu disk
+io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='io')
+atexit.register(io_executor.shutdown, wait=True)
+
 # Queue worker thread
 def queue_worker():
     """Background worker that processes jobs from queue"""
@@ -407,34 +755,28 @@ def queue_worker():
 
     while True:
         try:
+            # Blok sampai ada job dan slot proses kosong, tanpa polling
             job_id = job_queue.get_next_job()
             if job_id:
                 job_info = job_queue.active_jobs.get(job_id)
                 if job_info:
-                    logger.info(f"Worker processing job: {job_id}")
-                    # Start processing in a separate thread to allow concurrent processing
-                    processing_thread = threading.Thread(
-                        target=process_background_removal_job,
-                        args=(job_id, job_info.get('image_data'), job_info.get('filename'),
-                              job_info.get('optimization_params', {}), job_info.get('output_format', 'PNG'))
-                    )
-                    processing_thread.start()
+                    logger.info("Worker processing job: %s", job_id)
+                    # Proses di thread pool agar beberapa job berjalan bersamaan
+                    job_executor.submit(process_background_removal_job, job_id, job_info['record'])
                 else:
-                    logger.warning(f"Job {job_id} not found in active jobs")
-
-            time.sleep(1)  # Check for new jobs every second
+                    logger.warning("Job %s not found in active jobs", job_id)
 
         except Exception as e:
-            logger.error(f"Queue worker error: {str(e)}")
+            logger.error("Queue worker error: %s", e)
             time.sleep(5)  # Wait before retrying
 
 # Start queue worker thread
 worker_thread = threading.Thread(target=queue_worker, daemon=True)
 worker_thread.start()
 
-# Add static file serving
+# Add static file serving (fallback untuk development/Docker; di production nginx melayani /static/ langsung)
 @app.route('/static/<path:filename>')
-@log_api_access
+@limiter.exempt
 def serve_static(filename):
     return send_from_directory('static', filename)
 
@@ -443,27 +785,303 @@ def serve_static(filename):
 def favicon():
     return send_from_directory('static', 'favicon.png', mimetype='image/png')
 
+# Magic bytes format gambar yang didukung -> MIME type
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF8', 'image/gif'),
+    (b'BM', 'image/bmp'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+)
+
+def sniff_image(buf):
+    """Return the image MIME type from the first bytes, or None if not a supported image"""
+    for signature, mimetype in IMAGE_SIGNATURES:
+        if buf.startswith(signature):
+            return mimetype
+    if buf[:4] == b'RIFF' and buf[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+def spool_upload(file):
+    """Save an upload into UPLOAD_FOLDER for a queued job and return its path"""
+    fd, path = tempfile.mkstemp(dir=UPLOAD_FOLDER, suffix='.upload')
+    with os.fdopen(fd, 'wb') as f:
+        file.save(f)
+    return path
+
+def discard_spool(path):
+    """Delete a spooled upload once its job no longer needs it"""
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)
+
+def inspect_upload(file):
+    """
+    Check an upload in place without copying it into memory
+
+    Werkzeug spools large uploads to a temporary file, so the stream can be
+    sized with seek/tell and handed straight to PIL.
+
+    Returns:
+        (size in bytes, MIME type from the magic bytes or None); the stream is rewound
+    """
+    head = file.stream.read(12)
+    return stream_size(file.stream), sniff_image(head)
+
+def stream_size(stream):
+    """Return the size of a seekable stream and rewind it to the start"""
+    stream.seek(0, io.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+class BadImage(ValueError):
+    """Upload is not a usable image; returned to the client as a 400"""
+
+def check_image_header(size, mimetype, source='File'):
+    """Reject empty, truncated or non-image uploads before decoding"""
+    if size == 0:
+        raise BadImage(f'{source} is empty or corrupted')
+    if size < 8:
+        raise BadImage(f'{source} too small to be a valid image')
+    if not mimetype:
+        raise BadImage(f'{source} is not a supported image format')
+
+def read_base64_payload():
+    """
+    Read the image for the base64 endpoints
+
+    A JSON body carries {'image': <base64>, ...options}. An application/octet-stream
+    body is the raw image itself with options in the query string, skipping the
+    base64 round trip entirely.
+
+    Returns:
+        (image bytes, options mapping)
+    """
+    if request.mimetype == 'application/octet-stream':
+        return request.get_data(), request.args
+
+    data = request.get_json()
+    if not data or 'image' not in data:
+        raise BadImage('No image data provided')
+    try:
+        image_data = pybase64.b64decode(data['image'], validate=False)
+    except Exception as e:
+        raise BadImage('Invalid base64 data') from e
+    # String base64 tidak dipakai lagi; lepas referensinya agar tidak ikut tertahan selama job antri
+    data['image'] = None
+    return image_data, data
+
+def verify_if_strict(data, source='image file'):
+    """
+    Opt-in full PIL verify() for requests with ?strict=1
+
+    The magic-byte sniff is enough for the normal path (decoding rejects
+    corrupt data anyway); strict mode also walks the chunk checksums.
+    """
+    if request.args.get('strict') != '1':
+        return
+    stream = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    try:
+        Image.open(stream).verify()
+    except Exception as e:
+        raise BadImage(f'Invalid {source}: {str(e)}') from e
+    finally:
+        stream.seek(0)
+
+def decode_and_segment(source, max_width=None, max_height=None):
+    """
+    Decode an upload once and remove its background
+
+    Args:
+        source: image bytes, a file path or a file-like stream (e.g. the spooled upload)
+        max_width, max_height: output cap; the input is shrunk to it before segmentation
+
+    Returns:
+        (decoded input image, original (width, height), RGBA output image); the
+        decoded image may be smaller than the original when JPEG draft mode kicks in
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    try:
+        img = Image.open(source)
+        original_size = img.size  # draft() mengubah img.size, simpan ukuran asli dulu
+        if max_width or max_height:
+            # JPEG bisa decode langsung di skala 1/2, 1/4, 1/8 (tetap >= batas output); format lain diabaikan
+            draft_edge = max(max_width or 0, max_height or 0)
+            img.draft('RGB', (draft_edge, draft_edge))
+        img.load()  # Decode sekali, sekaligus validasi seperti verify()
+    except Exception as e:
+        raise BadImage(f'Invalid image file: {str(e)}') from e
+
+    if not (max_width or max_height):
+        return img, original_size, run_rembg(img)
+
+    # Output akan di-thumbnail ke batas ini, jadi perkecil input sebelum segmentasi
+    small = ImageOps.exif_transpose(img)  # Selalu mengembalikan image baru, img asli tidak berubah
+    small.thumbnail((max_width or small.width, max_height or small.height), Image.Resampling.LANCZOS)
+    return img, original_size, run_rembg(small)
+
+class ResultCache:
+    """
+    Thread-safe LRU of encoded outputs keyed by a hash of the input image and output params
+
+    Bounded by entry count and by the summed size of the cached output bytes;
+    outputs larger than max_entry_bytes are never cached.
+    """
+
+    def __init__(self, maxsize, ttl, max_bytes, max_entry_bytes):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.entries = OrderedDict()  # key -> (stored_at, value, nbytes)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(source, *params):
+        """SHA-256 of the output params and the image (bytes, path or seekable stream)"""
+        # OpenSSL memakai instruksi SHA-NI/ARMv8 SHA bila CPU mendukung, lebih cepat dari blake2b untuk upload besar
+        digest = hashlib.sha256(repr(params).encode())
+        if isinstance(source, (bytes, bytearray)):
+            digest.update(source)
+        else:
+            stream = open(source, 'rb') if isinstance(source, str) else source
+            try:
+                for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            finally:
+                if stream is source:
+                    stream.seek(0)
+                else:
+                    stream.close()
+        return digest.digest()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value, nbytes = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self.entries[key]
+                self.total_bytes -= nbytes
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, nbytes):
+        if nbytes > self.max_entry_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.total_bytes -= old[2]
+            self.entries[key] = (time.monotonic(), value, nbytes)
+            self.total_bytes += nbytes
+            while len(self.entries) > self.maxsize or self.total_bytes > self.max_bytes:
+                _, (_, _, evicted_bytes) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_bytes
+
+result_cache = ResultCache(
+    RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_MAX_ENTRY_BYTES
+) if RESULT_CACHE_SIZE > 0 and RESULT_CACHE_MAX_BYTES > 0 else None
+
+def render_output(source, size_bytes, output_format, quality, max_width, max_height, fast=False):
+    """
+    Remove background and encode the result, reusing the cached output for an identical upload
+
+    Returns:
+        (optimized image bytes, original image info, optimized image info)
+    """
+    key = None
+    if result_cache:
+        key = ResultCache.make_key(source, output_format, quality, max_width, max_height, fast)
+        cached = result_cache.get(key)
+        if cached:
+            logger.debug("Result cache hit: %s", key.hex())
+            return cached
+
+    img, original_size, output_image = decode_and_segment(source, max_width, max_height)
+    original_info = describe_image(img, size_bytes, size=original_size)
+
+    optimized_output_data, optimized_info = optimize_image(
+        output_image,
+        output_format=output_format,
+        quality=quality,
+        max_width=max_width,
+        max_height=max_height,
+        fast=fast
+    )
+    result = (optimized_output_data, original_info, optimized_info)
+
+    if key:
+        result_cache.put(key, result, len(optimized_output_data))
+    return result
+
+def run_rembg(img):
+    """
+    Remove background from a decoded image
+
+    Oversized inputs are segmented on a downscaled copy (U2-Net works at 320x320
+    anyway); the mask is then upscaled and applied to the full-resolution image.
+    """
+    if max(img.size) <= MAX_INPUT_EDGE:
+        return remove(img, session=INFERENCE_SESSION)
+
+    img = ImageOps.exif_transpose(img)
+    small = img.copy()
+    small.thumbnail((MAX_INPUT_EDGE, MAX_INPUT_EDGE), Image.Resampling.LANCZOS)
+
+    mask = remove(small, session=INFERENCE_SESSION, only_mask=True)
+    cutout = img.convert('RGBA')
+    cutout.putalpha(mask.resize(img.size, Image.Resampling.BILINEAR))
+    return cutout
+
+def _opt_int(value, default=None, lo=None, hi=None):
+    """Parse an optional integer form/JSON field; missing or invalid values give the default"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, float):
+        if value != value or value in (float('inf'), float('-inf')):
+            return default
+        value = int(value)
+    elif not isinstance(value, int):
+        value = str(value).strip()
+        # Maksimal satu tanda di depan, lalu hanya digit ASCII ('--5' dan '²' ditolak tanpa exception)
+        digits = value[1:] if value[:1] in ('-', '+') else value
+        if not (digits.isascii() and digits.isdigit()):
+            return default
+        value = int(value)
+    if lo is not None:
+        value = max(lo, value)
+    if hi is not None:
+        value = min(hi, value)
+    return value
+
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    _, dot, ext = filename.rpartition('.')
+    return bool(dot) and ext.lower() in ALLOWED_EXTENSIONS
 
-def optimize_image(image_data, output_format='PNG', quality=85, max_width=None, max_height=None):
+def optimize_image(image, output_format='PNG', quality=85, max_width=None, max_height=None, fast=False):
     """
-    Optimize image data with format, quality, and size options
+    Optimize image with format, quality, and size options
 
     Args:
-        image_data: Raw image data from rembg
+        image: PIL Image returned by rembg
         output_format: 'PNG', 'JPEG', or 'WEBP'
         quality: 1-100 for JPEG/WEBP quality
         max_width: Maximum width (None to keep original)
         max_height: Maximum height (None to keep original)
+        fast: Use the fastest encoder settings (preview output is short-lived)
 
     Returns:
-        Optimized image data
+        (optimized image data, info dict of the encoded image)
     """
     try:
-        # Open image with PIL
-        img = Image.open(io.BytesIO(image_data))
-        original_size = len(image_data)
+        img = image
 
         # Convert to RGB if needed for JPEG
         if output_format.upper() in ['JPEG', 'JPG'] and img.mode in ['RGBA', 'LA']:
@@ -489,47 +1107,66 @@ def optimize_image(image_data, output_format='PNG', quality=85, max_width=None,
         output_io = io.BytesIO()
 
         if output_format.upper() in ['JPEG', 'JPG']:
-            img.save(output_io, format='JPEG', quality=quality, optimize=True, progressive=True)
+            saved_format = 'JPEG'
+            img.save(output_io, format='JPEG', quality=quality, optimize=not fast, progressive=not fast)
         elif output_format.upper() == 'WEBP':
-            img.save(output_io, format='WEBP', quality=quality, optimize=True, method=6)
+            saved_format = 'WEBP'
+            img.save(output_io, format='WEBP', quality=quality, method=0 if fast else 6)
         else:  # PNG
-            img.save(output_io, format='PNG', optimize=True, compress_level=6)
+            saved_format = 'PNG'
+            # optimize=True memaksa zlib level 9; level rendah jauh lebih cepat untuk output RGBA besar
+            img.save(output_io, format='PNG', compress_level=1 if fast else PNG_COMPRESS_LEVEL)
 
-        output_io.seek(0)
         result = output_io.getvalue()
 
-        # Log compression results for monitoring
-        compression_ratio = ((1 - len(result) / original_size) * 100)
-        print(f"Image optimized: {original_size} -> {len(result)} bytes ({compression_ratio:.1f}% reduction)")
+        # Log encode results for monitoring
+        logger.debug("Image optimized: %dx%d %s -> %d bytes", img.width, img.height, saved_format, len(result))
 
-        return result
+        # Info diambil dari image yang baru di-encode, tanpa membuka ulang bytes hasil
+        return result, describe_image(img, len(result), saved_format)
 
     except Exception as e:
-        print(f"Error optimizing image: {str(e)}")
-        # Return original data if optimization fails
-        return image_data
+        logger.exception("Error optimizing image: %s", e)
+        # Fall back to a plain PNG encode if optimization fails
+        output_io = io.BytesIO()
+        image.save(output_io, format='PNG')
+        result = output_io.getvalue()
+        return result, describe_image(image, len(result), 'PNG')
+
+def describe_image(img, size_bytes, image_format=None, size=None):
+    """Get image information for display from an already opened image (size overrides img.size)"""
+    width, height = size or img.size
+    return {
+        'width': width,
+        'height': height,
+        'mode': img.mode,
+        'format': image_format or img.format or 'Unknown',
+        'size_bytes': size_bytes,
+        'size_mb': round(size_bytes / (1024 * 1024), 2)
+    }
+
+@app.before_request
+def reject_oversize_body():
+    """Refuse bodies over MAX_CONTENT_LENGTH from the Content-Length header, before anything reads them"""
+    if request.content_length is not None and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+        raise RequestEntityTooLarge()
+
+@app.errorhandler(413)
+def too_large_handler(e):
+    return jsonify({
+        'error': 'Request too large',
+        'max_bytes': app.config['MAX_CONTENT_LENGTH']
+    }), 413
 
-def get_image_info(image_data):
-    """Get image information for display"""
-    try:
-        img = Image.open(io.BytesIO(image_data))
-        return {
-            'width': img.width,
-            'height': img.height,
-            'mode': img.mode,
-            'format': img.format or 'Unknown',
-            'size_bytes': len(image_data),
-            'size_mb': round(len(image_data) / (1024 * 1024), 2)
-        }
-    except:
-        return {
-            'width': 'Unknown',
-            'height': 'Unknown',
-            'mode': 'Unknown',
-            'format': 'Unknown',
-            'size_bytes': len(image_data) if image_data else 0,
-            'size_mb': round(len(image_data) / (1024 * 1024), 2) if image_data else 0
-        }
+@app.errorhandler(BadImage)
+def bad_image_handler(e):
+    return jsonify({'error': str(e)}), 400
+
+@app.errorhandler(500)
+def server_error_handler(e):
+    original = getattr(e, 'original_exception', None) or e
+    logger.error("Server error: %s", original, exc_info=original)
+    return jsonify({'error': f'Server error: {str(original)}'}), 500
 
 # Error handler for rate limiting
 @app.errorhandler(429)
@@ -547,47 +1184,56 @@ def index():
     logger.info("WEB_PAGE_REQUEST | Background Remover web page accessed")
     return send_file('index.html')
 
+# Body /api konstan setelah startup, diserialisasi sekali saat import
+API_INFO_BODY = orjson.dumps({
+    'message': 'Background Remover API',
+    'version': os.getenv('APP_VERSION', '1.0.0'),
+    'app_name': os.getenv('APP_NAME', 'Background Remover API'),
+    'queue_config': {
+        'max_concurrent_jobs': MAX_CONCURRENT_JOBS,
+        'max_queue_size': MAX_QUEUE_SIZE,
+        'queue_timeout': QUEUE_TIMEOUT
+    },
+    'rate_limits': {
+        'default': f'{RATE_LIMIT_DEFAULT_PER_HOUR} per hour, {RATE_LIMIT_DEFAULT_PER_MINUTE} per minute',
+        'remove_background': f'{RATE_LIMIT_REMOVE_BG_PER_MINUTE} per minute',
+        'remove_background_preview': f'{RATE_LIMIT_PREVIEW_PER_MINUTE} per minute',
+        'remove_background_base64': f'{RATE_LIMIT_BASE64_PER_MINUTE} per minute',
+        'health': 'unlimited',
+        'info': f'{RATE_LIMIT_INFO_PER_MINUTE} per minute'
+    },
+    'endpoints': {
+        'remove_background': '/remove-background (POST) - Direct processing - Download hasil sebagai file',
+        'remove_background_preview': '/remove-background-preview (POST) - Direct processing - Preview hasil di browser',
+        'remove_background_base64': '/remove-background-base64 (POST) - Direct processing - Input/output base64',
+        'queue_remove_background': '/queue/remove-background (POST) - Queue-based processing - Download hasil sebagai file',
+        'queue_remove_background_base64': '/queue/remove-background-base64 (POST) - Queue-based processing - Input/output base64',
+        'queue_status': '/queue/status (GET) - Get current queue status',
+        'job_status': '/queue/job/<job_id> (GET) - Get specific job status (?wait=N untuk long-poll)',
+        'jobs_status': '/queue/jobs/status (POST) - Status beberapa job sekaligus: {"ids": [...], "wait": N}',
+        'job_result': '/queue/job/<job_id>/result (GET) - Download job result',
+        'health': '/health (GET)',
+        'info': '/api (GET)'
+    }
+})
+
 @app.route('/api')
 @limiter.limit(f"{RATE_LIMIT_INFO_PER_MINUTE} per minute")
 @log_api_access
 def api_info():
     logger.info("API_INFO_REQUEST | Background Remover API info accessed")
-    return jsonify({
-        'message': 'Background Remover API',
-        'version': os.getenv('APP_VERSION', '1.0.0'),
-        'app_name': os.getenv('APP_NAME', 'Background Remover API'),
-        'queue_config': {
-            'max_concurrent_jobs': MAX_CONCURRENT_JOBS,
-            'max_queue_size': MAX_QUEUE_SIZE,
-            'queue_timeout': QUEUE_TIMEOUT
-        },
-        'rate_limits': {
-            'default': f'{RATE_LIMIT_DEFAULT_PER_HOUR} per hour, {RATE_LIMIT_DEFAULT_PER_MINUTE} per minute',
-            'remove_background': f'{RATE_LIMIT_REMOVE_BG_PER_MINUTE} per minute',
-            'remove_background_preview': f'{RATE_LIMIT_PREVIEW_PER_MINUTE} per minute',
-            'remove_background_base64': f'{RATE_LIMIT_BASE64_PER_MINUTE} per minute',
-            'health': f'{RATE_LIMIT_HEALTH_PER_MINUTE} per minute',
-            'info': f'{RATE_LIMIT_INFO_PER_MINUTE} per minute'
-        },
-        'endpoints': {
-            'remove_background': '/remove-background (POST) - Direct processing - Download hasil sebagai file',
-            'remove_background_preview': '/remove-background-preview (POST) - Direct processing - Preview hasil di browser',
-            'remove_background_base64': '/remove-background-base64 (POST) - Direct processing - Input/output base64',
-            'queue_remove_background': '/queue/remove-background (POST) - Queue-based processing - Download hasil sebagai file',
-            'queue_remove_background_base64': '/queue/remove-background-base64 (POST) - Queue-based processing - Input/output base64',
-            'queue_status': '/queue/status (GET) - Get current queue status',
-            'job_status': '/queue/job/<job_id> (GET) - Get specific job status',
-            'job_result': '/queue/job/<job_id>/result (GET) - Download job result',
-            'health': '/health (GET)',
-            'info': '/api (GET)'
-        }
-    })
+    response = Response(API_INFO_BODY, mimetype='application/json')
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+# Body health check konstan, diserialisasi sekali saat import
+HEALTH_BODY = orjson.dumps({'status': 'healthy', 'service': 'background-remover'})
 
+# Liveness probe: tanpa rate limit dan tanpa log per request
 @app.route('/health')
-@limiter.limit(f"{RATE_LIMIT_HEALTH_PER_MINUTE} per minute")
-@log_api_access
+@limiter.exempt
 def health():
-    return jsonify({'status': 'healthy', 'service': 'background-remover'})
+    return Response(HEALTH_BODY, mimetype='application/json')
 
 @app.route('/queue/status')
 @limiter.limit(f"{RATE_LIMIT_INFO_PER_MINUTE} per minute")
@@ -601,13 +1247,40 @@ def queue_status():
 @limiter.limit(f"{RATE_LIMIT_INFO_PER_MINUTE} per minute")
 @log_api_access
 def job_status(job_id):
-    """Get specific job status"""
+    """Get specific job status; ?wait=N long-polls up to N seconds for the job to finish"""
+    wait = _opt_int(request.args.get('wait'), 0, lo=0, hi=LONG_POLL_MAX_SECONDS)
+    if wait:
+        job_queue.wait_for_jobs([job_id], wait)
     job_info = job_queue.get_job_status(job_id)
     if job_info:
         return jsonify(job_info)
     else:
         return jsonify({'error': 'Job not found'}), 404
 
+@app.route('/queue/jobs/status', methods=['POST'])
+@limiter.limit(f"{RATE_LIMIT_INFO_PER_MINUTE} per minute")
+@log_api_access
+def jobs_status():
+    """
+    Status of several jobs in one request
+
+    Body: {"ids": [...], "wait": N}; with wait the request long-polls until one of
+    the jobs finishes. Returns {job_id: status, or null if unknown}.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'ids must be a non-empty list of job ids'}), 400
+    job_ids = data.get('ids')
+    if not isinstance(job_ids, list) or not job_ids or not all(isinstance(job_id, str) for job_id in job_ids):
+        return jsonify({'error': 'ids must be a non-empty list of job ids'}), 400
+    if len(job_ids) > MAX_STATUS_BATCH:
+        return jsonify({'error': f'At most {MAX_STATUS_BATCH} job ids per request'}), 400
+
+    wait = _opt_int(data.get('wait'), 0, lo=0, hi=LONG_POLL_MAX_SECONDS)
+    if wait:
+        job_queue.wait_for_jobs(job_ids, wait)
+    return jsonify({job_id: job_queue.get_job_status(job_id) for job_id in job_ids})
+
 @app.route('/queue/job/<job_id>/result')
 @limiter.limit(f"{RATE_LIMIT_REMOVE_BG_PER_MINUTE} per minute")
 @log_api_access
@@ -623,20 +1296,17 @@ def get_job_result(job_id):
         return jsonify({'error': 'Job result not available'}), 404
 
     # Check if this is a base64 job
-    is_base64 = job_info.get('is_base64', False)
+    is_base64 = result_info.get('is_base64', False)
 
     if is_base64:
         # For base64 jobs, return the result as base64 JSON
         try:
-            output_path = result_info['output_path']
             output_format = result_info['output_format']
 
-            if not os.path.exists(output_path):
-                return jsonify({'error': 'Result file not found'}), 404
-
-            # Read the output file and convert to base64
-            with open(output_path, 'rb') as f:
-                result_base64 = base64.b64encode(f.read()).decode('utf-8')
+            # Hasil base64 sudah di-encode oleh worker dan disimpan di memory
+            result_base64 = job_info.get('result_base64')
+            if result_base64 is None:
+                return jsonify({'error': 'Result not found'}), 404
 
             # Calculate compression info
             original_info = result_info['original_info']
@@ -648,7 +1318,7 @@ def get_job_result(job_id):
             return jsonify({
                 'success': True,
                 'image': result_base64,
-                'mimetype': f'image/{output_format.lower()}',
+                'mimetype': _FORMAT_META[output_format][1],
                 'info': {
                     'original_size': original_info['size_bytes'],
                     'optimized_size': optimized_info['size_bytes'],
@@ -656,12 +1326,12 @@ def get_job_result(job_id):
                     'width': optimized_info['width'],
                     'height': optimized_info['height'],
                     'format': output_format,
-                    'quality': result_info.get('optimization_params', {}).get('quality', 85)
+                    'quality': result_info.get('quality', 85)
                 }
             })
 
         except Exception as e:
-            logger.error(f"Error serving base64 result for job {job_id}: {str(e)}")
+            logger.error("Error serving base64 result for job %s: %s", job_id, e)
             return jsonify({'error': 'Failed to get result'}), 500
 
     else:
@@ -675,7 +1345,7 @@ def get_job_result(job_id):
 
         try:
             # Determine file extension for download
-            download_ext = 'jpg' if output_format == 'JPG' else output_format.lower()
+            download_ext = _FORMAT_META[output_format][0]
             download_name = f"removed_bg_{filename.rsplit('.', 1)[0]}.{download_ext}"
 
             # Return the file
@@ -683,7 +1353,7 @@ def get_job_result(job_id):
                 output_path,
                 as_attachment=True,
                 download_name=download_name,
-                mimetype=f'image/{output_format.lower()}'
+                mimetype=_FORMAT_META[output_format][1]
             )
 
             # Add optimization info headers
@@ -694,12 +1364,12 @@ def get_job_result(job_id):
             response.headers['X-Compression-Ratio'] = str(round((1 - optimized_info['size_bytes'] / original_info['size_bytes']) * 100, 1)) if original_info['size_bytes'] > 0 else '0'
             response.headers['Access-Control-Expose-Headers'] = 'Content-Disposition, X-Original-Size, X-Optimized-Size, X-Compression-Ratio'
 
-            logger.info(f"QUEUE_RESULT_DOWNLOADED | {job_id} | {download_name}")
+            logger.info("QUEUE_RESULT_DOWNLOADED | %s | %s", job_id, download_name)
 
             return response
 
         except Exception as e:
-            logger.error(f"Error serving result for job {job_id}: {str(e)}")
+            logger.error("Error serving result for job %s: %s", job_id, e)
             return jsonify({'error': 'Failed to download result'}), 500
 
 @app.route('/queue/remove-background', methods=['POST'])
@@ -727,72 +1397,37 @@ def queue_remove_background():
             }), 400
 
         # Get client IP
-        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
+        client_ip = get_client_ip()
 
-        # Read image data
-        image_data = file.read()
-
-        # Validasi image data
-        if not image_data or len(image_data) == 0:
-            return jsonify({'error': 'File is empty or corrupted'}), 400
-
-        if len(image_data) < 8:
-            return jsonify({'error': 'File too small to be a valid image'}), 400
+        # Cek ukuran dan magic bytes langsung dari stream upload
+        image_size, mimetype = inspect_upload(file)
+        check_image_header(image_size, mimetype)
+        verify_if_strict(file.stream)
 
         # Get optimization parameters
-        output_format = request.form.get('format', 'PNG').upper()
-        quality = int(request.form.get('quality', 85))
-        max_width = request.form.get('max_width')
-        max_height = request.form.get('max_height')
-
-        # Validate format
-        if output_format not in ['PNG', 'JPEG', 'JPG', 'WEBP']:
-            output_format = 'PNG'
-
-        # Validate quality
-        quality = max(1, min(100, quality))
-
-        # Parse dimensions
-        if max_width:
-            try:
-                max_width = int(max_width) if max_width and max_width.strip() else None
-            except:
-                max_width = None
-
-        if max_height:
-            try:
-                max_height = int(max_height) if max_height and max_height.strip() else None
-            except:
-                max_height = None
-
-        # Create optimization params
-        optimization_params = {
-            'format': output_format,
-            'quality': quality,
-            'max_width': max_width,
-            'max_height': max_height
-        }
+        params = parse_optimization_params(request.form)
 
         # Add job to queue
         file_info = {
             'name': file.filename,
-            'size': len(image_data),
+            'size': image_size,
             'type': file.content_type or 'unknown'
         }
 
-        job_id, error = job_queue.add_job('background_removal', client_ip, file_info)
+        # Data job disimpan bersama job, sebelum worker bisa mengambilnya
+        record = JobRecord(
+            image_source=spool_upload(file),
+            filename=file.filename,
+            optimization_params=params
+        )
+
+        job_id, error = job_queue.add_job('background_removal', client_ip, file_info, record)
 
         if error:
+            discard_spool(record.image_source)
             return jsonify({'error': error}), 429  # Too Many Requests
 
-        # Store job data
-        if job_id in job_queue.active_jobs:
-            job_queue.active_jobs[job_id]['image_data'] = image_data
-            job_queue.active_jobs[job_id]['filename'] = file.filename
-            job_queue.active_jobs[job_id]['optimization_params'] = optimization_params
-            job_queue.active_jobs[job_id]['output_format'] = output_format
-
-        logger.info(f"QUEUE_JOB_CREATED | {job_id} | {file.filename} | IP: {client_ip}")
+        logger.info("QUEUE_JOB_CREATED | %s | %s | IP: %s", job_id, file.filename, client_ip)
 
         return jsonify({
             'job_id': job_id,
@@ -802,9 +1437,12 @@ def queue_remove_background():
             'queue_status': job_queue.get_queue_status()
         })
 
+    except BadImage as e:
+        return jsonify({'error': str(e)}), 400
+    except HTTPException:
+        raise  # 413 dari body chunked yang melewati batas, dsb.
     except Exception as e:
-        logger.error(f"Error queuing job: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error queuing job: %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 @app.route('/queue/remove-background-base64', methods=['POST'])
@@ -814,60 +1452,18 @@ def queue_remove_background():
 def queue_remove_background_base64():
     """Queue-based background removal for base64 input"""
     try:
-        data = request.get_json()
-
-        if not data or 'image' not in data:
-            return jsonify({'error': 'No image data provided'}), 400
+        # JSON base64 atau bytes mentah (application/octet-stream)
+        image_data, data = read_base64_payload()
 
         # Get client IP
-        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
-
-        # Decode base64
-        try:
-            image_data = base64.b64decode(data['image'])
-        except:
-            return jsonify({'error': 'Invalid base64 data'}), 400
-
-        # Validasi image data
-        if not image_data or len(image_data) == 0:
-            return jsonify({'error': 'Base64 image data is empty or corrupted'}), 400
+        client_ip = get_client_ip()
 
-        if len(image_data) < 8:
-            return jsonify({'error': 'Base64 data too small to be a valid image'}), 400
+        # Validasi ukuran dan magic bytes sebelum decode penuh
+        check_image_header(len(image_data), sniff_image(image_data[:12]), 'Base64 data')
+        verify_if_strict(image_data, 'base64 image data')
 
         # Get optimization parameters
-        output_format = data.get('format', 'PNG').upper()
-        quality = int(data.get('quality', 85))
-        max_width = data.get('max_width')
-        max_height = data.get('max_height')
-
-        # Validate format
-        if output_format not in ['PNG', 'JPEG', 'JPG', 'WEBP']:
-            output_format = 'PNG'
-
-        # Validate quality
-        quality = max(1, min(100, quality))
-
-        # Parse dimensions
-        if max_width:
-            try:
-                max_width = int(max_width) if str(max_width).strip() else None
-            except:
-                max_width = None
-
-        if max_height:
-            try:
-                max_height = int(max_height) if str(max_height).strip() else None
-            except:
-                max_height = None
-
-        # Create optimization params
-        optimization_params = {
-            'format': output_format,
-            'quality': quality,
-            'max_width': max_width,
-            'max_height': max_height
-        }
+        params = parse_optimization_params(data)
 
         # Add job to queue
         file_info = {
@@ -876,21 +1472,20 @@ def queue_remove_background_base64():
             'type': 'base64'
         }
 
-        job_id, error = job_queue.add_job('background_removal_base64', client_ip, file_info)
+        # Data job disimpan bersama job, sebelum worker bisa mengambilnya
+        record = JobRecord(
+            image_source=image_data,
+            filename='base64_input',
+            optimization_params=params,
+            is_base64=True
+        )
+
+        job_id, error = job_queue.add_job('background_removal_base64', client_ip, file_info, record)
 
         if error:
             return jsonify({'error': error}), 429  # Too Many Requests
 
-        # Store job data
-        if job_id in job_queue.active_jobs:
-            job_queue.active_jobs[job_id]['image_data'] = image_data
-            job_queue.active_jobs[job_id]['filename'] = 'base64_input'
-            job_queue.active_jobs[job_id]['optimization_params'] = optimization_params
-            job_queue.active_jobs[job_id]['output_format'] = output_format
-            job_queue.active_jobs[job_id]['is_base64'] = True
-            job_queue.active_jobs[job_id]['original_base64'] = data['image']
-
-        logger.info(f"QUEUE_JOB_CREATED_BASE64 | {job_id} | IP: {client_ip}")
+        logger.info("QUEUE_JOB_CREATED_BASE64 | %s | IP: %s", job_id, client_ip)
 
         return jsonify({
             'job_id': job_id,
@@ -899,9 +1494,12 @@ def queue_remove_background_base64():
             'result_url': f'/queue/job/{job_id}/result'  # For base64, we'll need to modify result endpoint
         })
 
+    except BadImage as e:
+        return jsonify({'error': str(e)}), 400
+    except HTTPException:
+        raise  # 413 dari body chunked yang melewati batas, dsb.
     except Exception as e:
-        logger.error(f"Error queuing base64 job: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error queuing base64 job: %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 @app.route('/remove-background', methods=['POST'])
@@ -909,154 +1507,66 @@ def queue_remove_background_base64():
 @log_api_access
 @log_file_upload
 def remove_background():
-    try:
-        # Cek apakah file ada di request
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-
-        file = request.files['file']
-
-        # Cek apakah file dipilih
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-
-        # Validasi file
-        if not allowed_file(file.filename):
-            return jsonify({
-                'error': 'File type not allowed',
-                'allowed_types': list(ALLOWED_EXTENSIONS)
-            }), 400
-
-        # Get optimization parameters from form
-        output_format = request.form.get('format', 'PNG').upper()
-        quality = int(request.form.get('quality', 85))
-        max_width = request.form.get('max_width')
-        max_height = request.form.get('max_height')
-
-        # Validate format
-        if output_format not in ['PNG', 'JPEG', 'JPG', 'WEBP']:
-            output_format = 'PNG'
-
-        # Validate quality
-        quality = max(1, min(100, quality))
-
-        # Parse dimensions
-        if max_width:
-            try:
-                max_width = int(max_width) if max_width and max_width.strip() else None
-            except:
-                max_width = None
-
-        if max_height:
-            try:
-                max_height = int(max_height) if max_height and max_height.strip() else None
-            except:
-                max_height = None
-
-        print(f"Processing with optimization: {output_format}, quality={quality}, size={max_width}x{max_height}")
-
-        # Generate unique filename
-        file_id = str(uuid.uuid4())
-        input_filename = f"{file_id}_input.png"
-        output_filename = f"{file_id}_output.{output_format.lower() if output_format != 'JPG' else 'jpg'}"
-        input_path = os.path.join(UPLOAD_FOLDER, input_filename)
-        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-
-        try:
-            # Baca file gambar
-            image_data = file.read()
-
-            # Validasi bahwa image_data tidak kosong
-            print(f"DEBUG: Image data length: {len(image_data) if image_data else 0}")
-            if not image_data or len(image_data) == 0:
-                return jsonify({'error': 'File is empty or corrupted'}), 400
-
-            # Validasi bahwa data terlihat seperti data gambar (cek header magic)
-            if len(image_data) < 8:
-                print(f"DEBUG: Image data too small: {len(image_data)} bytes")
-                return jsonify({'error': 'File too small to be a valid image'}), 400
-
-            # Validasi image dengan PIL sebelum memproses dengan rembg
-            try:
-                from PIL import Image
-                img = Image.open(io.BytesIO(image_data))
-                img.verify()  # Verifikasi bahwa ini adalah gambar valid
-            except Exception as img_e:
-                return jsonify({'error': f'Invalid image file: {str(img_e)}'}), 400
-
-            # Reset BytesIO untuk rembg (karena verify() mengkonsumsi stream)
-            img_data_for_rembg = io.BytesIO(image_data)
-
-            # Proses background removal
-            print(f"Processing image: {file.filename}")
-            raw_output_data = remove(img_data_for_rembg.read())
-
-            # Get original image info
-            original_info = get_image_info(image_data)
-            print(f"Original image: {original_info}")
-
-            # Optimize the output
-            optimized_output_data = optimize_image(
-                raw_output_data,
-                output_format=output_format,
-                quality=quality,
-                max_width=max_width,
-                max_height=max_height
-            )
-
-            # Get optimized image info
-            optimized_info = get_image_info(optimized_output_data)
-            print(f"Optimized image: {optimized_info}")
-
-            # Simpan hasil
-            with open(output_path, 'wb') as f:
-                f.write(optimized_output_data)
-
-            # Determine file extension for download
-            download_ext = 'jpg' if output_format == 'JPG' else output_format.lower()
-            download_name = f"removed_bg_{file.filename.rsplit('.', 1)[0]}.{download_ext}"
-
-            # Kembalikan hasil sebagai file
-            response = send_file(
-                output_path,
-                as_attachment=True,
-                download_name=download_name,
-                mimetype=f'image/{output_format.lower()}'
-            )
-
-            # Add optimization info headers
-            response.headers['X-Original-Size'] = str(original_info['size_bytes'])
-            response.headers['X-Optimized-Size'] = str(optimized_info['size_bytes'])
-            response.headers['X-Compression-Ratio'] = str(round((1 - optimized_info['size_bytes'] / original_info['size_bytes']) * 100, 1)) if original_info['size_bytes'] > 0 else '0'
+    # Cek apakah file ada di request
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
 
-            # Tambahkan headers untuk memastikan download bekerja dengan baik di browser
-            response.headers['Access-Control-Expose-Headers'] = 'Content-Disposition, X-Original-Size, X-Optimized-Size, X-Compression-Ratio'
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-
-            return response
+    file = request.files['file']
 
-        except OSError as e:
-            # Handle specific OS errors like Invalid argument
-            print(f"OS Error processing image: {str(e)}")
-            error_msg = f'Failed to process image: {str(e)}'
-            if 'Invalid argument' in str(e) or e.errno == 22:
-                error_msg = 'Failed to process image: Invalid image data or corrupted file'
-            return jsonify({'error': error_msg}), 500
-        except Exception as e:
-            print(f"Error processing image: {str(e)}")
-            return jsonify({'error': f'Failed to process image: {str(e)}'}), 500
-
-        finally:
-            # Cleanup input file
-            if os.path.exists(input_path):
-                os.remove(input_path)
+    # Cek apakah file dipilih
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
 
-    except Exception as e:
-        print(f"Server error: {str(e)}")
-        print(traceback.format_exc())
-        return jsonify({'error': f'Server error: {str(e)}'}), 500
+    # Validasi file
+    if not allowed_file(file.filename):
+        return jsonify({
+            'error': 'File type not allowed',
+            'allowed_types': list(ALLOWED_EXTENSIONS)
+        }), 400
+
+    # Get optimization parameters
+    params = parse_optimization_params(request.form)
+
+    logger.debug("Processing with optimization: %s, quality=%d, size=%sx%s", params.format, params.quality, params.max_width, params.max_height)
+
+    # Cek ukuran dan magic bytes langsung dari stream upload, tanpa menyalin ke memory
+    image_size, mimetype = inspect_upload(file)
+    logger.debug("Image data length: %d", image_size)
+    check_image_header(image_size, mimetype)
+    verify_if_strict(file.stream)
+
+    # Proses background removal dan optimize output
+    logger.debug("Processing image: %s", file.filename)
+    optimized_output_data, original_info, optimized_info = render_output(
+        file.stream, image_size, params.format, params.quality, params.max_width, params.max_height
+    )
+    logger.debug("Original image: %s", original_info)
+    logger.debug("Optimized image: %s", optimized_info)
+
+    # Determine file extension for download
+    download_ext = _FORMAT_META[params.format][0]
+    download_name = f"removed_bg_{file.filename.rsplit('.', 1)[0]}.{download_ext}"
+
+    # Kembalikan hasil langsung dari memory, tanpa menulis ke disk
+    response = send_file(
+        io.BytesIO(optimized_output_data),
+        as_attachment=True,
+        download_name=download_name,
+        mimetype=_FORMAT_META[params.format][1]
+    )
+
+    # Add optimization info headers
+    response.headers['X-Original-Size'] = str(original_info['size_bytes'])
+    response.headers['X-Optimized-Size'] = str(optimized_info['size_bytes'])
+    response.headers['X-Compression-Ratio'] = str(round((1 - optimized_info['size_bytes'] / original_info['size_bytes']) * 100, 1)) if original_info['size_bytes'] > 0 else '0'
+
+    # Tambahkan headers untuk memastikan download bekerja dengan baik di browser
+    response.headers['Access-Control-Expose-Headers'] = 'Content-Disposition, X-Original-Size, X-Optimized-Size, X-Compression-Ratio'
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+
+    return response
 
 @app.route('/remove-background-preview', methods=['POST'])
 @limiter.limit(f"{RATE_LIMIT_PREVIEW_PER_MINUTE} per minute")
@@ -1067,160 +1577,95 @@ def remove_background_preview():
     Endpoint untuk background removal yang otomatis menggunakan queue
     Jika tidak ada antrian, langsung proses. Jika ada antrian, kembalikan job ID.
     """
-    try:
-        # Cek apakah file ada di request
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-
-        file = request.files['file']
+    # Cek apakah file ada di request
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
 
-        # Cek apakah file dipilih
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-
-        # Validasi file
-        if not allowed_file(file.filename):
-            return jsonify({
-                'error': 'File type not allowed',
-                'allowed_types': list(ALLOWED_EXTENSIONS)
-            }), 400
-
-        # Get client IP
-        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
-
-        # Get optimization parameters from form
-        output_format = request.form.get('format', 'PNG').upper()
-        quality = int(request.form.get('quality', 85))
-        max_width = request.form.get('max_width')
-        max_height = request.form.get('max_height')
-
-        # Validate format
-        if output_format not in ['PNG', 'JPEG', 'JPG', 'WEBP']:
-            output_format = 'PNG'
-
-        # Validate quality
-        quality = max(1, min(100, quality))
-
-        # Parse dimensions
-        if max_width:
-            try:
-                max_width = int(max_width) if max_width and max_width.strip() else None
-            except:
-                max_width = None
-
-        if max_height:
-            try:
-                max_height = int(max_height) if max_height and max_height.strip() else None
-            except:
-                max_height = None
-
-        # Read image data
-        image_data = file.read()
-
-        # Validasi image data
-        if not image_data or len(image_data) == 0:
-            return jsonify({'error': 'File is empty or corrupted'}), 400
-
-        if len(image_data) < 8:
-            return jsonify({'error': 'File too small to be a valid image'}), 400
-
-        # Check if we can process immediately (no active jobs or under limit)
-        status = job_queue.get_queue_status()
-
-        # For small images and no queue, process immediately
-        if (status['active_jobs'] < MAX_CONCURRENT_JOBS and
-            status['queue_length'] == 0 and
-            len(image_data) < 5 * 1024 * 1024):  # Less than 5MB
-            try:
-                # Validasi image dengan PIL
-                from PIL import Image
-                img = Image.open(io.BytesIO(image_data))
-                img.verify()
-            except Exception as img_e:
-                return jsonify({'error': f'Invalid image file: {str(img_e)}'}), 400
-
-            # Reset BytesIO untuk rembg
-            img_data_for_rembg = io.BytesIO(image_data)
-
-            # Proses langsung
-            print(f"Processing image directly (no queue): {file.filename}")
-            raw_output_data = remove(img_data_for_rembg.read())
-
-            # Optimize for preview (cap at smaller sizes)
-            preview_max_width = min(max_width or 800, 800)
-            preview_max_height = min(max_height or 600, 600)
-
-            optimized_output_data = optimize_image(
-                raw_output_data,
-                output_format=output_format,
-                quality=quality,
-                max_width=preview_max_width,
-                max_height=preview_max_height
-            )
+    file = request.files['file']
 
-            optimized_info = get_image_info(optimized_output_data)
+    # Cek apakah file dipilih
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
 
-            # Return image directly
-            response = send_file(
-                io.BytesIO(optimized_output_data),
-                mimetype=f'image/{output_format.lower()}',
-                as_attachment=False,
-                download_name=None
-            )
-
-            response.headers['X-Image-Width'] = str(optimized_info['width'])
-            response.headers['X-Image-Height'] = str(optimized_info['height'])
-            response.headers['X-Image-Size'] = str(optimized_info['size_bytes'])
-            response.headers['X-Processing-Type'] = 'direct'
+    # Validasi file
+    if not allowed_file(file.filename):
+        return jsonify({
+            'error': 'File type not allowed',
+            'allowed_types': list(ALLOWED_EXTENSIONS)
+        }), 400
+
+    # Get client IP
+    client_ip = get_client_ip()
+
+    # Get optimization parameters
+    params = parse_optimization_params(request.form, is_preview=True)
+
+    # Cek ukuran dan magic bytes langsung dari stream upload
+    image_size, mimetype = inspect_upload(file)
+    check_image_header(image_size, mimetype)
+    verify_if_strict(file.stream)
+
+    # Check if we can process immediately (no active jobs or under limit)
+    active_jobs, queue_length = job_queue.load()
+
+    # For small images and no queue, process immediately
+    if (active_jobs < MAX_CONCURRENT_JOBS and
+        queue_length == 0 and
+        image_size < 5 * 1024 * 1024):  # Less than 5MB
+        # Optimize for preview (cap at smaller sizes)
+        preview_max_width = min(params.max_width or 800, 800)
+        preview_max_height = min(params.max_height or 600, 600)
+
+        # Proses langsung, decode dari stream upload
+        logger.debug("Processing image directly (no queue): %s", file.filename)
+        optimized_output_data, _, optimized_info = render_output(
+            file.stream, image_size, params.format, params.quality, preview_max_width, preview_max_height, fast=True
+        )
 
-            logger.info(f"DIRECT_PROCESSING | {file.filename} | IP: {client_ip}")
+        # Return image directly
+        # Bytes hasil encode langsung jadi body; tanpa BytesIO + file wrapper yang membaca per 8KB
+        response = Response(optimized_output_data, mimetype=_FORMAT_META[params.format][1])
 
-            return response
+        response.headers['X-Image-Width'] = str(optimized_info['width'])
+        response.headers['X-Image-Height'] = str(optimized_info['height'])
+        response.headers['X-Image-Size'] = str(optimized_info['size_bytes'])
+        response.headers['X-Processing-Type'] = 'direct'
 
-        # Add to queue if we can't process immediately
-        else:
-            # Create optimization params
-            optimization_params = {
-                'format': output_format,
-                'quality': quality,
-                'max_width': max_width,
-                'max_height': max_height,
-                'is_preview': True  # Mark as preview job
-            }
+        logger.info("DIRECT_PROCESSING | %s | IP: %s", file.filename, client_ip)
 
-            file_info = {
-                'name': file.filename,
-                'size': len(image_data),
-                'type': file.content_type or 'unknown'
-            }
+        return response
 
-            job_id, error = job_queue.add_job('background_removal_preview', client_ip, file_info)
+    # Add to queue if we can't process immediately
+    else:
+        file_info = {
+            'name': file.filename,
+            'size': image_size,
+            'type': file.content_type or 'unknown'
+        }
 
-            if error:
-                return jsonify({'error': error}), 429
+        # Upload di-spool ke disk; worker membacanya dari file, bukan dari bytes di memory
+        record = JobRecord(
+            image_source=spool_upload(file),
+            filename=file.filename,
+            optimization_params=params
+        )
 
-            # Store job data
-            if job_id in job_queue.active_jobs:
-                job_queue.active_jobs[job_id]['image_data'] = image_data
-                job_queue.active_jobs[job_id]['filename'] = file.filename
-                job_queue.active_jobs[job_id]['optimization_params'] = optimization_params
-                job_queue.active_jobs[job_id]['output_format'] = output_format
+        job_id, error = job_queue.add_job('background_removal_preview', client_ip, file_info, record)
 
-            logger.info(f"QUEUE_JOB_CREATED_PREVIEW | {job_id} | {file.filename} | IP: {client_ip}")
+        if error:
+            discard_spool(record.image_source)
+            return jsonify({'error': error}), 429
 
-            return jsonify({
-                'job_id': job_id,
-                'message': 'Job added to queue successfully',
-                'status_url': f'/queue/job/{job_id}',
-                'result_url': f'/queue/job/{job_id}/result',
-                'queue_position': status['queue_length'] + 1,
-                'processing_type': 'queued'
-            })
+        logger.info("QUEUE_JOB_CREATED_PREVIEW | %s | %s | IP: %s", job_id, file.filename, client_ip)
 
-    except Exception as e:
-        logger.error(f"Error in preview endpoint: {str(e)}")
-        logger.error(traceback.format_exc())
-        return jsonify({'error': f'Server error: {str(e)}'}), 500
+        return jsonify({
+            'job_id': job_id,
+            'message': 'Job added to queue successfully',
+            'status_url': f'/queue/job/{job_id}',
+            'result_url': f'/queue/job/{job_id}/result',
+            'queue_position': queue_length + 1,
+            'processing_type': 'queued'
+        })
 
 @app.route('/read-file', methods=['POST'])
 @limiter.limit(f"{RATE_LIMIT_BASE64_PER_MINUTE} per minute")
@@ -1234,12 +1679,9 @@ def read_file():
             return jsonify({'error': 'No file path provided'}), 400
 
         file_path = data['file_path']
-        logger.info(f"FILE_READ_REQUEST | Attempting to read file: {file_path}")
+        logger.info("FILE_READ_REQUEST | Attempting to read file: %s", file_path)
 
         # Security: Validate file path to prevent directory traversal
-        import os
-        import re
-
         # Basic path validation - only allow certain extensions and no directory traversal
         if '..' in file_path or file_path.startswith('/') or ':' not in file_path:
             return jsonify({'error': 'Invalid file path format'}), 400
@@ -1261,7 +1703,7 @@ def read_file():
                 return jsonify({'error': 'File is empty'}), 400
 
         except Exception as e:
-            logger.error(f"FILE_ACCESS_ERROR | {str(e)}")
+            logger.error("FILE_ACCESS_ERROR | %s", e)
             return jsonify({'error': f'Cannot access file: {str(e)}'}), 500
 
         # Read file content
@@ -1269,7 +1711,7 @@ def read_file():
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read().strip()
 
-            logger.info(f"FILE_READ_SUCCESS | File read successfully: {file_path} ({file_size} bytes)")
+            logger.info("FILE_READ_SUCCESS | File read successfully: %s (%s bytes)", file_path, file_size)
 
             return jsonify({
                 'success': True,
@@ -1280,12 +1722,11 @@ def read_file():
         except UnicodeDecodeError:
             return jsonify({'error': 'File encoding error. Please ensure the file is UTF-8 encoded.'}), 400
         except Exception as e:
-            logger.error(f"FILE_READ_ERROR | {str(e)}")
+            logger.error("FILE_READ_ERROR | %s", e)
             return jsonify({'error': f'Error reading file: {str(e)}'}), 500
 
     except Exception as e:
-        logger.error(f"SERVER_ERROR | {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception("SERVER_ERROR | %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 @app.route('/remove-background-base64', methods=['POST'])
@@ -1297,184 +1738,160 @@ def remove_background_base64():
     Endpoint untuk background removal dengan base64 yang otomatis menggunakan queue
     Jika tidak ada antrian, langsung proses. Jika ada antrian, kembalikan job ID.
     """
-    try:
-        data = request.get_json()
-
-        if not data or 'image' not in data:
-            return jsonify({'error': 'No image data provided'}), 400
+    # JSON base64 atau bytes mentah (application/octet-stream)
+    image_data, data = read_base64_payload()
 
-        # Get client IP
-        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
-
-        # Get optimization parameters
-        output_format = data.get('format', 'PNG').upper()
-        quality = int(data.get('quality', 85))
-        max_width = data.get('max_width')
-        max_height = data.get('max_height')
+    # Get client IP
+    client_ip = get_client_ip()
 
-        # Validate format
-        if output_format not in ['PNG', 'JPEG', 'JPG', 'WEBP']:
-            output_format = 'PNG'
+    # Get optimization parameters
+    params = parse_optimization_params(data)
 
-        # Validate quality
-        quality = max(1, min(100, quality))
+    check_image_header(len(image_data), sniff_image(image_data[:12]), 'Base64 data')
+    verify_if_strict(image_data, 'base64 image data')
 
-        # Parse dimensions
-        if max_width:
-            try:
-                max_width = int(max_width) if str(max_width).strip() else None
-            except:
-                max_width = None
-
-        if max_height:
-            try:
-                max_height = int(max_height) if str(max_height).strip() else None
-            except:
-                max_height = None
+    # Check if we can process immediately
+    active_jobs, queue_length = job_queue.load()
 
-        # Decode base64
-        try:
-            image_data = base64.b64decode(data['image'])
-        except:
-            return jsonify({'error': 'Invalid base64 data'}), 400
-
-        # Validasi image data
-        if not image_data or len(image_data) == 0:
-            return jsonify({'error': 'Base64 image data is empty or corrupted'}), 400
-
-        if len(image_data) < 8:
-            return jsonify({'error': 'Base64 data too small to be a valid image'}), 400
+    # For small images and no queue, process immediately
+    if (active_jobs < MAX_CONCURRENT_JOBS and
+        queue_length == 0 and
+        len(image_data) < 5 * 1024 * 1024):  # Less than 5MB
+        # Proses langsung
+        logger.debug("Processing base64 image directly (no queue)")
+        optimized_output_data, original_info, optimized_info = render_output(
+            image_data, len(image_data), params.format, params.quality, params.max_width, params.max_height
+        )
 
-        # Check if we can process immediately
-        status = job_queue.get_queue_status()
+        # Encode hasil ke base64
+        result_base64 = pybase64.b64encode(optimized_output_data).decode('ascii')
 
-        # For small images and no queue, process immediately
-        if (status['active_jobs'] < MAX_CONCURRENT_JOBS and
-            status['queue_length'] == 0 and
-            len(image_data) < 5 * 1024 * 1024):  # Less than 5MB
-            try:
-                # Validasi image dengan PIL
-                from PIL import Image
-                img = Image.open(io.BytesIO(image_data))
-                img.verify()
-            except Exception as img_e:
-                return jsonify({'error': f'Invalid base64 image: {str(img_e)}'}), 400
-
-            # Reset BytesIO untuk rembg
-            img_data_for_rembg = io.BytesIO(image_data)
-
-            # Proses langsung
-            print("Processing base64 image directly (no queue)")
-            raw_output_data = remove(img_data_for_rembg.read())
-
-            # Get original image info
-            original_info = get_image_info(image_data)
-
-            # Optimize the output
-            optimized_output_data = optimize_image(
-                raw_output_data,
-                output_format=output_format,
-                quality=quality,
-                max_width=max_width,
-                max_height=max_height
-            )
+        # Calculate compression info
+        compression_ratio = 0
+        if original_info['size_bytes'] > 0:
+            compression_ratio = round((1 - optimized_info['size_bytes'] / original_info['size_bytes']) * 100, 1)
 
-            # Get optimized image info
-            optimized_info = get_image_info(optimized_output_data)
+        logger.info("DIRECT_PROCESSING_BASE64 | IP: %s | Size: %s bytes", client_ip, len(image_data))
 
-            # Encode hasil ke base64
-            result_base64 = base64.b64encode(optimized_output_data).decode('utf-8')
-
-            # Calculate compression info
-            compression_ratio = 0
-            if original_info['size_bytes'] > 0:
-                compression_ratio = round((1 - optimized_info['size_bytes'] / original_info['size_bytes']) * 100, 1)
+        return jsonify({
+            'success': True,
+            'image': result_base64,
+            'mimetype': _FORMAT_META[params.format][1],
+            'processing_type': 'direct',
+            'info': {
+                'original_size': original_info['size_bytes'],
+                'optimized_size': optimized_info['size_bytes'],
+                'compression_ratio': compression_ratio,
+                'width': optimized_info['width'],
+                'height': optimized_info['height'],
+                'format': params.format,
+                'quality': params.quality
+            }
+        })
 
-            logger.info(f"DIRECT_PROCESSING_BASE64 | IP: {client_ip} | Size: {len(image_data)} bytes")
+    # Add to queue if we can't process immediately
+    else:
+        file_info = {
+            'name': 'base64_input',
+            'size': len(image_data),
+            'type': 'base64'
+        }
 
-            return jsonify({
-                'success': True,
-                'image': result_base64,
-                'mimetype': f'image/{output_format.lower()}',
-                'processing_type': 'direct',
-                'info': {
-                    'original_size': original_info['size_bytes'],
-                    'optimized_size': optimized_info['size_bytes'],
-                    'compression_ratio': compression_ratio,
-                    'width': optimized_info['width'],
-                    'height': optimized_info['height'],
-                    'format': output_format,
-                    'quality': quality
-                }
-            })
+        # Data job disimpan bersama job, sebelum worker bisa mengambilnya
+        record = JobRecord(
+            image_source=image_data,
+            filename='base64_input',
+            optimization_params=params,
+            is_base64=True
+        )
 
-        # Add to queue if we can't process immediately
-        else:
-            # Create optimization params
-            optimization_params = {
-                'format': output_format,
-                'quality': quality,
-                'max_width': max_width,
-                'max_height': max_height
-            }
+        job_id, error = job_queue.add_job('background_removal_base64', client_ip, file_info, record)
 
-            file_info = {
-                'name': 'base64_input',
-                'size': len(image_data),
-                'type': 'base64'
-            }
+        if error:
+            return jsonify({'error': error}), 429
 
-            job_id, error = job_queue.add_job('background_removal_base64', client_ip, file_info)
+        logger.info("QUEUE_JOB_CREATED_BASE64 | %s | IP: %s", job_id, client_ip)
 
-            if error:
-                return jsonify({'error': error}), 429
+        return jsonify({
+            'job_id': job_id,
+            'message': 'Base64 job added to queue successfully',
+            'status_url': f'/queue/job/{job_id}',
+            'result_url': f'/queue/job/{job_id}/result',
+            'queue_position': queue_length + 1,
+            'processing_type': 'queued'
+        })
 
-            # Store job data
-            if job_id in job_queue.active_jobs:
-                job_queue.active_jobs[job_id]['image_data'] = image_data
-                job_queue.active_jobs[job_id]['filename'] = 'base64_input'
-                job_queue.active_jobs[job_id]['optimization_params'] = optimization_params
-                job_queue.active_jobs[job_id]['output_format'] = output_format
-                job_queue.active_jobs[job_id]['is_base64'] = True
-                job_queue.active_jobs[job_id]['original_base64'] = data['image']
+# File hasil yang ditulis proses ini, diurutkan menurut waktu kedaluwarsa: (expiry_ts, path)
+expiry_heap = []
+expiry_lock = threading.Lock()
 
-            logger.info(f"QUEUE_JOB_CREATED_BASE64 | {job_id} | IP: {client_ip}")
+def schedule_expiry(path):
+    """Register a freshly written file for deletion after FILE_TTL_SECONDS"""
+    with expiry_lock:
+        heapq.heappush(expiry_heap, (time.time() + FILE_TTL_SECONDS, path))
 
-            return jsonify({
-                'job_id': job_id,
-                'message': 'Base64 job added to queue successfully',
-                'status_url': f'/queue/job/{job_id}',
-                'result_url': f'/queue/job/{job_id}/result',
-                'queue_position': status['queue_length'] + 1,
-                'processing_type': 'queued'
-            })
+def expire_files():
+    """Delete files whose TTL has passed; only looks at the expired head of the heap"""
+    now = time.time()
+    expired = []
+    with expiry_lock:
+        while expiry_heap and expiry_heap[0][0] <= now:
+            expired.append(heapq.heappop(expiry_heap)[1])
 
-    except Exception as e:
-        logger.error(f"Error in base64 endpoint: {str(e)}")
-        logger.error(traceback.format_exc())
-        return jsonify({'error': f'Server error: {str(e)}'}), 500
+    for path in expired:
+        try:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+            logger.info("Cleaned up old file: %s", os.path.basename(path))
+        except Exception as e:
+            logger.error("Error cleaning up %s: %s", path, e)
 
-# Cleanup function untuk menghapus file lama
+# Scan penuh folder saat startup: file sisa proses sebelumnya (termasuk worker yang di-recycle
+# atau crash) dihapus jika sudah kedaluwarsa, sisanya dijadwalkan ke heap sesuai mtime-nya
 def cleanup_old_files():
-    import time
     current_time = time.time()
+    live = []
 
     for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER]:
-        for filename in os.listdir(folder):
-            file_path = os.path.join(folder, filename)
-            if os.path.isfile(file_path):
-                # Hapus file yang lebih tua dari 1 jam
-                if current_time - os.path.getmtime(file_path) > 3600:
-                    try:
-                        os.remove(file_path)
-                        print(f"Cleaned up old file: {filename}")
-                    except Exception as e:
-                        print(f"Error cleaning up {filename}: {e}")
+        # scandir memakai data stat dari pembacaan direktori, bukan syscall per file
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                expires_at = entry.stat().st_mtime + FILE_TTL_SECONDS
+                if expires_at > current_time:
+                    live.append((expires_at, entry.path))
+                    continue
+                try:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(entry.path)
+                    logger.info("Cleaned up old file: %s", entry.name)
+                except Exception as e:
+                    logger.error("Error cleaning up %s: %s", entry.name, e)
+
+    with expiry_lock:
+        for item in live:
+            heapq.heappush(expiry_heap, item)
+
+def cleanup_worker():
+    """Background thread that sweeps leftover files once, then expires scheduled files periodically"""
+    try:
+        cleanup_old_files()
+    except Exception as e:
+        logger.error("Cleanup worker error: %s", e)
 
-if __name__ == '__main__':
-    # Cleanup files lama saat startup
-    cleanup_old_files()
+    while True:
+        time.sleep(CLEANUP_INTERVAL_SECONDS)
+        try:
+            expire_files()
+        except Exception as e:
+            logger.error("Cleanup worker error: %s", e)
 
+# Start cleanup thread (juga jalan di bawah gunicorn, bukan hanya saat __main__)
+cleanup_thread = threading.Thread(target=cleanup_worker, daemon=True)
+cleanup_thread.start()
+
+if __name__ == '__main__':
     # Log startup
     app_name = os.getenv('APP_NAME', 'Background Remover API')
     app_version = os.getenv('APP_VERSION', '1.0.0')
@@ -1501,4 +1918,4 @@ if __name__ == '__main__':
     host = os.getenv('HOST', '0.0.0.0')
     port = int(os.getenv('PORT', 5001))
 
-    app.run(debug=debug_mode, host=host, port=port)
\ No newline at end of file
+    app.run(debug=debug_mode, host=host, port=port, threaded=True)
\ No newline at end of file
@@ -120,7 +120,6 @@ python3 -m venv venv
 source venv/bin/activate
 pip install --upgrade pip
 pip install -r requirements.txt
-pip install gunicorn
 EOF
 
     log "Application deployed successfully"
@@ -169,7 +168,7 @@ User=$APP_USER
 Group=$APP_USER
 WorkingDirectory=$APP_DIR
 Environment="PATH=$APP_DIR/venv/bin"
-ExecStart=$APP_DIR/venv/bin/gunicorn --config gunicorn.conf.py app:app
+ExecStart=$APP_DIR/venv/bin/gunicorn --config gunicorn.conf.py wsgi:app
 Restart=always
 RestartSec=10
 StandardOutput=journal
@@ -189,19 +188,23 @@ EOF
     # Create Gunicorn configuration
     sudo -u "$APP_USER" cat > "$APP_DIR/gunicorn.conf.py" << EOF
 import multiprocessing
+import os
 
 bind = "127.0.0.1:5001"
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+ort_intra_op_threads = int(os.getenv("ORT_INTRA_OP_THREADS", "4"))
+workers = max(1, multiprocessing.cpu_count() // ort_intra_op_threads)
+worker_class = "gthread"
+threads = 4
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 100
 timeout = 120
 keepalive = 2
-preload_app = True
+preload_app = False
 user = "$APP_USER"
 group = "$APP_USER"
 tmp_upload_dir = None
+sendfile = True
 logconfig = None
 accesslog = "-"
 errorlog = "-"
@@ -2,17 +2,32 @@
 import multiprocessing
 import os
 
+from dotenv import load_dotenv
+
+# Baca .env seperti app.py, agar GUNICORN_THREADS dkk. sama di master dan di worker
+# (LONG_POLL_MAX_WAITERS di app.py diturunkan dari GUNICORN_THREADS)
+load_dotenv()
+
 # Server socket
-bind = "0.0.0.0:5001"
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# gthread workers let upload parsing, base64 work and response streaming of other
+# requests overlap with rembg inference (ONNX Runtime releases the GIL)
+# Each worker runs ONNX Runtime with ORT_INTRA_OP_THREADS threads, so size the pool
+# to cores / threads to avoid workers fighting over the same cores
+ort_intra_op_threads = int(os.getenv("ORT_INTRA_OP_THREADS", "4"))
+os.environ.setdefault("OMP_NUM_THREADS", str(ort_intra_op_threads))
+workers = int(os.getenv("GUNICORN_WORKERS", max(1, multiprocessing.cpu_count() // ort_intra_op_threads)))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 100
-preload_app = True
+# Jangan preload: session ONNX Runtime (thread pool-nya) dan thread queue worker/batcher
+# tidak ikut ter-fork, jadi tiap worker memuat dan warm-up model sendiri sebelum melayani request
+preload_app = False
 timeout = 120
 keepalive = 2
 
@@ -31,6 +46,9 @@ pidfile = '/tmp/bg_remover.pid'
 user = None
 group = None
 tmp_upload_dir = None
+# File hasil job (send_file dengan path) dikirim lewat wsgi.file_wrapper gunicorn memakai os.sendfile,
+# jadi byte-nya langsung dari page cache ke socket tanpa loop read()/write() di Python
+sendfile = True
 
 # SSL (if needed)
 keyfile = None
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Quantize the rembg U2-Net model to INT8 for faster CPU inference
+This script downloads the FP32 model through rembg, runs ONNX Runtime static
+quantization with a small calibration set (or dynamic-range quantization, which
+needs no calibration data), and optionally compares the INT8 masks against FP32
+on a held-out set (mean IoU) before deploying.
+
+Requires the onnx package, which onnxruntime.quantization imports but the API does not
+need, so it is not in requirements.txt:
+    pip install onnx
+
+Usage:
+    python quantize_model.py --calibration-dir samples/calib --validate-dir samples/holdout
+    python quantize_model.py --mode dynamic --validate-dir samples/holdout
+
+Then point the API at the result:
+    REMBG_MODEL_PATH=~/.u2net/u2net_int8.onnx
+"""
+
+import argparse
+import os
+
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+from PIL import Image
+from rembg import new_session
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.webp')
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+SIZE = (320, 320)
+
+def list_images(folder):
+    """List image files in a folder"""
+    return sorted(
+        os.path.join(folder, name)
+        for name in os.listdir(folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+def preprocess(session, image_path):
+    """Normalize an image the same way rembg does for U2-Net"""
+    img = Image.open(image_path).convert('RGB')
+    return session.normalize(img, MEAN, STD, SIZE)
+
+class ImageCalibrationReader(CalibrationDataReader):
+    """Feed calibration images to quantize_static one at a time"""
+
+    def __init__(self, session, image_paths):
+        self.inputs = iter([preprocess(session, path) for path in image_paths])
+
+    def get_next(self):
+        return next(self.inputs, None)
+
+def predict_mask(inference_session, inputs):
+    """Run U2-Net and return a binary mask"""
+    input_name = inference_session.get_inputs()[0].name
+    pred = inference_session.run(None, {input_name: next(iter(inputs.values()))})[0][0, 0]
+    pred = (pred - pred.min()) / (pred.max() - pred.min())
+    return pred > 0.5
+
+def validate(session, fp32_path, int8_path, image_paths):
+    """Compare INT8 masks with FP32 masks, return mean IoU"""
+    fp32 = ort.InferenceSession(fp32_path, providers=['CPUExecutionProvider'])
+    int8 = ort.InferenceSession(int8_path, providers=['CPUExecutionProvider'])
+
+    ious = []
+    for path in image_paths:
+        inputs = preprocess(session, path)
+        mask_fp32 = predict_mask(fp32, inputs)
+        mask_int8 = predict_mask(int8, inputs)
+        union = np.logical_or(mask_fp32, mask_int8).sum()
+        iou = np.logical_and(mask_fp32, mask_int8).sum() / union if union else 1.0
+        ious.append(iou)
+        print(f"  {os.path.basename(path)}: IoU {iou:.4f}")
+
+    return float(np.mean(ious))
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantize the rembg U2-Net model to INT8')
+    parser.add_argument('--model', default='u2net', help='rembg model to quantize (default: u2net)')
+    parser.add_argument('--mode', choices=['static', 'dynamic'], default='static',
+                        help='static (calibrated activations) or dynamic (weights only, no calibration)')
+    parser.add_argument('--calibration-dir', help='Folder with sample images for calibration (static mode)')
+    parser.add_argument('--validate-dir', help='Folder with held-out images for IoU validation')
+    parser.add_argument('--output', help='Output path (default: <U2NET_HOME>/<model>_int8.onnx)')
+    parser.add_argument('--min-iou', type=float, default=0.95, help='Minimum mean IoU to accept (default: 0.95)')
+    args = parser.parse_args()
+
+    # new_session downloads the FP32 model into U2NET_HOME if needed
+    session = new_session(args.model, providers=['CPUExecutionProvider'])
+    u2net_home = os.path.expanduser(os.getenv('U2NET_HOME', os.path.join('~', '.u2net')))
+    fp32_path = os.path.join(u2net_home, f"{args.model}.onnx")
+    int8_path = args.output or os.path.join(u2net_home, f"{args.model}_int8.onnx")
+
+    if args.mode == 'dynamic':
+        print(f"Quantizing {fp32_path} (dynamic range, weights only)...")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    else:
+        if not args.calibration_dir:
+            print("❌ --calibration-dir is required for static quantization")
+            return 1
+
+        calibration_images = list_images(args.calibration_dir)
+        if not calibration_images:
+            print(f"❌ No images found in {args.calibration_dir}")
+            return 1
+
+        print(f"Quantizing {fp32_path} with {len(calibration_images)} calibration images...")
+        quantize_static(
+            fp32_path,
+            int8_path,
+            ImageCalibrationReader(session, calibration_images),
+            quant_format=QuantFormat.QDQ,
+            weight_type=QuantType.QInt8,
+        )
+
+    print(f"✅ Saved INT8 model: {int8_path}")
+    print(f"Size: {os.path.getsize(fp32_path)} -> {os.path.getsize(int8_path)} bytes")
+
+    if args.validate_dir:
+        print(f"\nValidating against FP32 on {args.validate_dir}...")
+        mean_iou = validate(session, fp32_path, int8_path, list_images(args.validate_dir))
+        print(f"Mean IoU: {mean_iou:.4f}")
+        if mean_iou < args.min_iou:
+            print(f"❌ Mean IoU below {args.min_iou}, do not deploy this model")
+            return 1
+        print("✅ INT8 model is within tolerance")
+
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,6 +1,18 @@
+import os
 import requests
-import base64
-import json
+from requests.adapters import HTTPAdapter
+import pybase64
+import orjson
+
+try:
+    # Opsional: body multipart di-stream dari disk, tidak dirakit utuh di memory
+    from requests_toolbelt.multipart.encoder import MultipartEncoder
+except ImportError:
+    MultipartEncoder = None
+
+# Satu Session agar koneksi keep-alive ke API dipakai ulang antar test
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=0))
 
 def test_api_with_file(image_path):
     """Test API dengan file upload"""
@@ -8,18 +20,26 @@ def test_api_with_file(image_path):
 
     try:
         with open(image_path, 'rb') as f:
-            files = {'file': f}
-            response = requests.post(url, files=files)
-
-            if response.status_code == 200:
-                # Simpan hasil
-                with open('result_file.png', 'wb') as result_file:
-                    result_file.write(response.content)
-                print(f"✅ Success! Result saved as result_file.png")
-                print(f"File size: {len(response.content)} bytes")
+            if MultipartEncoder:
+                encoder = MultipartEncoder(fields={'file': (os.path.basename(image_path), f, 'application/octet-stream')})
+                response = SESSION.post(url, data=encoder, headers={'Content-Type': encoder.content_type}, stream=True)
             else:
-                print(f"❌ Error: {response.status_code}")
-                print(response.text)
+                response = SESSION.post(url, files={'file': f}, stream=True)
+
+            with response:
+                if response.status_code == 200:
+                    # Simpan hasil per chunk, tanpa menampung seluruh PNG di memory
+                    size = 0
+                    with open('result_file.png', 'wb') as result_file:
+                        for chunk in response.iter_content(chunk_size=65536):
+                            result_file.write(chunk)
+                            size += len(chunk)
+                    print(f"✅ Success! Result saved as result_file.png")
+                    print(f"File size: {size} bytes")
+                else:
+                    print(f"❌ Error: {response.status_code}")
+                    # Response di-stream: cukup baca 512 byte pertama
+                    print(next(response.iter_content(512), b'').decode('utf-8', 'replace'))
 
     except FileNotFoundError:
         print(f"❌ File not found: {image_path}")
@@ -34,17 +54,17 @@ def test_api_with_base64(image_path):
         # Baca dan encode gambar ke base64
         with open(image_path, 'rb') as f:
             image_data = f.read()
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
 
-        # Kirim request
-        payload = {"image": image_base64}
-        response = requests.post(url, json=payload)
+        # Kirim request; base64 (alfabetnya aman di JSON string) langsung disambung sebagai bytes,
+        # tanpa decode ke str lalu di-encode ulang oleh json=
+        body = b'{"image":"' + pybase64.b64encode(image_data) + b'"}'
+        response = SESSION.post(url, data=body, headers={'Content-Type': 'application/json'})
 
         if response.status_code == 200:
-            result = response.json()
+            result = orjson.loads(response.content)
             if result['success']:
                 # Decode dan simpan hasil
-                result_data = base64.b64decode(result['image'])
+                result_data = pybase64.b64decode(result['image'], validate=True)
                 with open('result_base64.png', 'wb') as result_file:
                     result_file.write(result_data)
                 print(f"✅ Success! Result saved as result_base64.png")
@@ -53,7 +73,7 @@ def test_api_with_base64(image_path):
                 print(f"❌ Error in processing: {result}")
         else:
             print(f"❌ Error: {response.status_code}")
-            print(response.text)
+            print(response.content[:512].decode('utf-8', 'replace'))
 
     except FileNotFoundError:
         print(f"❌ File not found: {image_path}")
@@ -64,9 +84,9 @@ def test_health():
     """Test health endpoint"""
     url = "http://127.0.0.1:5001/health"
     try:
-        response = requests.get(url)
+        response = SESSION.get(url)
         if response.status_code == 200:
-            print("✅ Health check passed:", response.json())
+            print("✅ Health check passed:", orjson.loads(response.content))
         else:
             print(f"❌ Health check failed: {response.status_code}")
     except Exception as e:
@@ -5,107 +5,151 @@ This script tests the queue functionality with multiple concurrent requests
 """
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3 import encode_multipart_formdata
+import orjson
 import time
 import threading
 import random
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
-import base64
+import pybase64
 
 # Configuration
 API_BASE = "http://127.0.0.1:5001"
 NUM_CONCURRENT_REQUESTS = 5
 NUM_TEST_IMAGES = 3
-
-# Create a simple test image data (1x1 PNG)
-def create_test_image_data():
-    # 1x1 red pixel PNG
-    png_data = base64.b64decode(
-        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8/5+hHgAHggJ/PchI7wAAAABJRU5ErkJggg=="
-    )
-    return png_data
+LONG_POLL_SECONDS = 5  # ?wait= untuk status job; sama dengan default LONG_POLL_MAX_SECONDS server
+
+# Session bersama: pool koneksi keep-alive dipakai semua thread ThreadPoolExecutor
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=0))
+
+# 1x1 red pixel PNG, di-decode sekali saat import; bytes immutable jadi aman dipakai bersama antar thread
+TEST_IMAGE_PNG = pybase64.b64decode(
+    b"iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8/5+hHgAHggJ/PchI7wAAAABJRU5ErkJggg=="
+)
+
+# Body multipart submit job sama untuk semua job: dirakit sekali dengan boundary tetap, lalu dikirim apa adanya
+SUBMIT_BODY, SUBMIT_CONTENT_TYPE = encode_multipart_formdata({
+    'file': ('test_image.png', TEST_IMAGE_PNG, 'image/png'),
+    'format': 'PNG',
+    'quality': '85',
+    'max_width': '800',
+    'max_height': '600'
+}, boundary='bg-remover-test-boundary')
 
 def test_queue_status():
     """Test queue status endpoint"""
     try:
-        response = requests.get(f"{API_BASE}/queue/status")
+        response = SESSION.get(f"{API_BASE}/queue/status")
         print(f"Queue Status: {response.status_code}")
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             print(f"  Queue length: {data['queue_length']}")
             print(f"  Active jobs: {data['active_jobs']}")
             print(f"  Max concurrent: {data['max_concurrent_jobs']}")
             return data
         else:
-            print(f"Error: {response.text}")
+            print(f"Error: {response.content[:512].decode('utf-8', 'replace')}")
             return None
     except Exception as e:
         print(f"Error testing queue status: {e}")
         return None
 
-def submit_queue_job(job_id):
-    """Submit a job to the queue"""
+def submit_queue_job(job_id, max_attempts=1):
+    """Submit a job to the queue (rate-limited/unavailable responses are retried up to max_attempts)"""
     try:
-        # Create test image
-        image_data = create_test_image_data()
-
-        # Prepare form data
-        files = {
-            'file': (f'test_image_{job_id}.png', image_data, 'image/png')
-        }
-        data = {
-            'format': 'PNG',
-            'quality': 85,
-            'max_width': 800,
-            'max_height': 600
-        }
-
         print(f"[Job {job_id}] Submitting to queue...")
-        response = requests.post(f"{API_BASE}/queue/remove-background", files=files, data=data)
+        for attempt in range(max_attempts):
+            response = SESSION.post(
+                f"{API_BASE}/queue/remove-background",
+                data=SUBMIT_BODY,
+                headers={'Content-Type': SUBMIT_CONTENT_TYPE}
+            )
+            # Hanya rate limit / 503 yang dicoba lagi; 429 "Queue is full" adalah hasil yang diuji
+            retryable = response.status_code == 503 or (
+                response.status_code == 429 and b'Rate limit exceeded' in response.content
+            )
+            if not retryable or attempt == max_attempts - 1:
+                break
+            # Backoff eksponensial + jitter agar retry dari banyak thread tidak serempak
+            time.sleep(min(2 ** attempt * 0.05 + random.random() * 0.05, 1.0))
 
         if response.status_code == 200:
-            result = response.json()
+            result = orjson.loads(response.content)
             job_id_returned = result['job_id']
             print(f"[Job {job_id}] Successfully submitted! Job ID: {job_id_returned}")
             return job_id_returned, True
         else:
-            print(f"[Job {job_id}] Failed to submit: {response.status_code} - {response.text}")
+            print(f"[Job {job_id}] Failed to submit: {response.status_code} - {response.content[:512].decode('utf-8', 'replace')}")
             return None, False
 
     except Exception as e:
         print(f"[Job {job_id}] Error submitting job: {e}")
         return None, False
 
-def check_job_status(job_id):
-    """Check status of a specific job"""
+# Status completed/failed tidak berubah lagi, jadi disimpan dan tidak perlu diminta ulang ke server
+TERMINAL_STATUSES = ('completed', 'failed')
+_JOB_STATUS_CACHE = {}
+
+def _remember_status(job_id, status):
+    if status and status['status'] in TERMINAL_STATUSES:
+        _JOB_STATUS_CACHE[job_id] = status
+    return status
+
+def check_jobs_status(job_ids, wait=0):
+    """Check status of several jobs in one request -> {job_id: status or None}"""
+    statuses = {job_id: _JOB_STATUS_CACHE[job_id] for job_id in job_ids if job_id in _JOB_STATUS_CACHE}
+    unknown = [job_id for job_id in job_ids if job_id not in statuses]
+    if not unknown:
+        return statuses
     try:
-        response = requests.get(f"{API_BASE}/queue/job/{job_id}")
+        response = SESSION.post(
+            f"{API_BASE}/queue/jobs/status",
+            data=orjson.dumps({'ids': unknown, 'wait': wait}),
+            headers={'Content-Type': 'application/json'},
+            timeout=wait + 10
+        )
         if response.status_code == 200:
-            return response.json()
+            for job_id, status in orjson.loads(response.content).items():
+                statuses[job_id] = _remember_status(job_id, status)
+            return statuses
         else:
-            print(f"[Job {job_id}] Status check failed: {response.status_code}")
+            print(f"Batch status check failed: {response.status_code}")
             return None
     except Exception as e:
-        print(f"[Job {job_id}] Error checking status: {e}")
+        print(f"Error checking batch status: {e}")
         return None
 
-def wait_for_job_completion(job_id, timeout=120):
-    """Wait for a job to complete"""
-    start_time = time.time()
-
-    while time.time() - start_time < timeout:
-        status = check_job_status(job_id)
-        if status:
-            print(f"[Job {job_id}] Status: {status['status']} - {status['message']} ({status['progress']}%)")
-
-            if status['status'] in ['completed', 'failed']:
-                return status
-
-        time.sleep(2)  # Check every 2 seconds
-
-    print(f"[Job {job_id}] Timeout waiting for completion")
-    return None
+def wait_for_jobs_completion(job_ids, timeout=120):
+    """Wait for several jobs with one batched status request per round -> {job_id: final status}"""
+    start_time = time.monotonic()
+    delay = 0.2
+    pending = set(job_ids)
+    finished = {}
+
+    while pending and time.monotonic() - start_time < timeout:
+        # Long-poll: server menjawab begitu salah satu job selesai
+        wait = max(1, min(LONG_POLL_SECONDS, int(timeout - (time.monotonic() - start_time))))
+        poll_start = time.monotonic()
+        pending_before = len(pending)
+        statuses = check_jobs_status(sorted(pending), wait) or {}
+
+        for job_id, status in statuses.items():
+            if status and status['status'] in TERMINAL_STATUSES:
+                print(f"[Job {job_id}] Status: {status['status']} - {status['message']} ({status['progress']}%)")
+                finished[job_id] = status
+                pending.discard(job_id)
+
+        # Tidak ada yang selesai dan jawaban datang cepat: error atau server tanpa long-poll, pakai backoff
+        if len(pending) == pending_before and time.monotonic() - poll_start < wait / 2:
+            time.sleep(delay)
+            delay = min(delay * 2, 2)
+
+    for job_id in pending:
+        print(f"[Job {job_id}] Timeout waiting for completion")
+    return finished
 
 def test_concurrent_requests():
     """Test multiple concurrent requests"""
@@ -130,12 +174,9 @@ def test_concurrent_requests():
 
     print(f"\nSubmitted {len(submitted_jobs)} jobs successfully")
 
-    # Wait for all jobs to complete
-    completed_jobs = []
-    for job_id in submitted_jobs:
-        final_status = wait_for_job_completion(job_id)
-        if final_status:
-            completed_jobs.append((job_id, final_status['status']))
+    # Wait for all jobs to complete (satu request status untuk semua job per putaran)
+    finished = wait_for_jobs_completion(submitted_jobs) if submitted_jobs else {}
+    completed_jobs = [(job_id, status['status']) for job_id, status in finished.items()]
 
     print(f"\n=== Results ===")
     print(f"Total submitted: {len(submitted_jobs)}")
@@ -163,24 +204,26 @@ def test_queue_limits():
     print(f"Max queue size: {max_queue_size}")
 
     # Try to submit more jobs than the queue can handle
-    # Submit jobs until queue is full
+    # Kirim sekaligus (burst) lewat thread pool, jumlah in-flight dibatasi NUM_CONCURRENT_REQUESTS
     submitted_count = 0
     failed_count = 0
 
-    for i in range(max_queue_size + 5):  # Try to submit more than max
-        job_id, success = submit_queue_job(f"limit_test_{i}")
-        if success:
-            submitted_count += 1
-        else:
-            failed_count += 1
+    with ThreadPoolExecutor(max_workers=NUM_CONCURRENT_REQUESTS) as executor:
+        futures = [
+            executor.submit(submit_queue_job, f"limit_test_{i}", 5)
+            for i in range(max_queue_size + 5)  # Try to submit more than max
+        ]
 
-        # Check queue status
-        current_status = test_queue_status()
-        if current_status and current_status['queue_length'] >= max_queue_size:
-            print(f"Queue is full at {current_status['queue_length']} jobs")
-            break
+        for future in as_completed(futures):
+            job_id, success = future.result()
+            if success:
+                submitted_count += 1
+            else:
+                failed_count += 1
 
-        time.sleep(0.1)  # Small delay between submissions
+    current_status = test_queue_status()
+    if current_status and current_status['queue_length'] >= max_queue_size:
+        print(f"Queue is full at {current_status['queue_length']} jobs")
 
     print(f"Submitted: {submitted_count}, Failed: {failed_count}")
 
@@ -195,9 +238,9 @@ def test_api_info():
     print(f"\n=== Testing API Info ===")
 
     try:
-        response = requests.get(f"{API_BASE}/api")
+        response = SESSION.get(f"{API_BASE}/api")
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             print(f"App name: {data['app_name']}")
             print(f"Version: {data['version']}")
 
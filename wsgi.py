@@ -0,0 +1,5 @@
+# WSGI entry point for production servers (gunicorn --config gunicorn.conf.py wsgi:app)
+# app.py's __main__ block (Flask dev server) is only for local development.
+from app import app
+
+__all__ = ['app']